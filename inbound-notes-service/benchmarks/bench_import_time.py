@@ -0,0 +1,98 @@
+"""
+Benchmark de regresión del arranque en frío: importa handler.py en un
+proceso nuevo con `-X importtime` (como hace Lambda en la fase de init) e
+informa del tiempo total y de los módulos más caros.
+
+Falla (código 1) si durante el init se importa alguno de los módulos que
+solo necesitan algunas funciones (openpyxl, requests por defecto) o si el
+init supera --max-ms:
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --service ../outbound-notes-service --top 20
+    python benchmarks/bench_import_time.py --repeat 5 --max-ms 1500
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Variables mínimas para que handler.py cargue sin AWS (no hace llamadas en el
+# import)
+HANDLER_ENV = {
+    "DYNAMO_TABLE": "Bench-Notes",
+    "PRODUCTS_API_URL": "http://localhost/products",
+    "S3_BUCKET_NAME": "bench-notes",
+    "AWS_DEFAULT_REGION": "us-east-1",
+}
+
+# Línea de -X importtime: "import time: self [us] | cumulative | module"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_handler(service_dir):
+    """
+    Importa handler en un proceso nuevo. Devuelve [(módulo, self_us,
+    cumulative_us, nivel)] en el orden de -X importtime.
+    """
+    env = dict(os.environ, **HANDLER_ENV)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import handler"],
+        env=env, cwd=service_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import handler failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", default=SERVICE_DIR, help="directorio del servicio (con handler.py)")
+    parser.add_argument("--repeat", type=int, default=3, help="se informa la mejor de N ejecuciones")
+    parser.add_argument("--top", type=int, default=15, help="módulos de primer nivel a listar")
+    parser.add_argument("--forbid", nargs="*", default=["openpyxl", "requests"],
+                        help="paquetes que no deben importarse en el init")
+    parser.add_argument("--max-ms", type=float, default=None, help="tiempo máximo de import de handler")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.repeat):
+        modules = import_handler(args.service)
+        total = next(cumulative for name, _, cumulative, _ in reversed(modules) if name == "handler")
+        if best is None or total < best[0]:
+            best = (total, modules)
+    total, modules = best
+
+    # Módulos importados directamente por handler (nivel 1 bajo él)
+    direct = sorted(
+        ((name, cumulative) for name, _, cumulative, level in modules if level == 1),
+        key=lambda entry: entry[1], reverse=True,
+    )
+    print(f"{os.path.basename(os.path.normpath(args.service))}: import handler {total / 1000:.1f} ms "
+          f"({len(modules)} modules, best of {args.repeat})")
+    print(f"{'cumulative (ms)':>16}  module")
+    for name, cumulative in direct[:args.top]:
+        print(f"{cumulative / 1000:>16.1f}  {name}")
+
+    failures = []
+    loaded = {name for name, _, _, _ in modules}
+    for package in args.forbid:
+        if package in loaded:
+            failures.append(f"{package} is imported at init")
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        failures.append(f"import handler took {total / 1000:.1f} ms (max {args.max_ms} ms)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
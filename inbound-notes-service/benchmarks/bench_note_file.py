@@ -0,0 +1,114 @@
+"""
+Benchmark: generación del xlsx de una nota con el Workbook normal de
+openpyxl (celdas en memoria, como lo hacía get_*_note_file) vs el modo
+write-only de `workbooks.write_note_workbook` (NOTE_WORKBOOK_WRITER=openpyxl).
+
+Mide tiempo y pico de memoria (tracemalloc) para varios tamaños de nota y
+comprueba que ambos libros tienen el mismo contenido:
+
+    python benchmarks/bench_note_file.py
+    python benchmarks/bench_note_file.py --sizes 100 10000 100000 --repeat 3
+"""
+import argparse
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("NOTE_WORKBOOK_WRITER", "openpyxl")
+
+import openpyxl  # noqa: E402
+
+from workbooks import write_note_workbook  # noqa: E402
+
+
+def write_note_workbook_legacy(note, output):
+    """
+    Implementación anterior: Workbook normal con acceso aleatorio a celdas.
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Note Details'
+
+    ws['A1'] = 'NoteID'
+    ws['B1'] = note.get('NoteID')
+    ws['A2'] = 'Date'
+    ws['B2'] = note.get('Date')
+
+    ws.append([])
+    ws.append(['ProductID', 'Quantity'])
+    for product in note.get('Products', []):
+        ws.append([product.get('ProductID'), product.get('Quantity')])
+
+    wb.save(output)
+
+
+def make_note(lines):
+    return {
+        "NoteID": "bench-note",
+        "Date": "2024-05-01",
+        "Products": [{"ProductID": f"P{n:06d}", "Quantity": n % 97 + 1} for n in range(lines)],
+    }
+
+
+def measure(writer, note):
+    """
+    Tiempo sin trazar (tracemalloc lo multiplica) y pico de memoria en una
+    segunda ejecución trazada.
+    """
+    gc.collect()
+    started = time.perf_counter()
+    output = io.BytesIO()
+    writer(note, output)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    writer(note, io.BytesIO())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, output.getvalue()
+
+
+def rows(data):
+    """
+    Valores de la hoja sin las celdas vacías del final de cada fila (el
+    lector devuelve la fila en blanco como () o como (None, None)).
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+    values = []
+    for row in wb.worksheets[0].iter_rows(values_only=True):
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        values.append(row)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1, help="se informa la mejor de N ejecuciones")
+    args = parser.parse_args()
+
+    writers = [("normal", write_note_workbook_legacy), ("write-only", write_note_workbook)]
+    print(f"{'lines':>8} {'mode':>11} {'time (s)':>10} {'peak (MB)':>10} {'size (KB)':>10}")
+    for size in args.sizes:
+        note = make_note(size)
+        outputs = {}
+        for name, writer in writers:
+            best_time, best_peak = float("inf"), float("inf")
+            for _ in range(args.repeat):
+                elapsed, peak, data = measure(writer, note)
+                best_time, best_peak = min(best_time, elapsed), min(best_peak, peak)
+            outputs[name] = data
+            print(f"{size:>8} {name:>11} {best_time:>10.3f} {best_peak / 2**20:>10.1f} {len(data) / 1024:>10.1f}")
+        # El modo write-only no debe cambiar el contenido del archivo
+        assert rows(outputs["normal"]) == rows(outputs["write-only"]), "workbooks differ"
+
+
+if __name__ == "__main__":
+    main()
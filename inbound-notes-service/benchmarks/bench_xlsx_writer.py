@@ -0,0 +1,134 @@
+"""
+Benchmark: xlsx de una nota con xlsx_writer (nativo) vs openpyxl en modo
+normal y write-only.
+
+Cada medida corre en un proceso nuevo para que el coste de importación y el
+pico de RSS (ru_maxrss) sean los de un arranque en frío con un solo
+escritor cargado. Además comprueba que los tres libros tienen las mismas
+celdas al leerlos con openpyxl:
+
+    python benchmarks/bench_xlsx_writer.py
+    python benchmarks/bench_xlsx_writer.py --sizes 100 10000 100000 --repeat 3
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, SERVICE_DIR)
+
+MODES = ("native", "write-only", "normal")
+
+
+def make_note(lines):
+    # Igual que bench_note_file.make_note, sin importar ese módulo (que carga
+    # openpyxl) antes de medir el import del escritor
+    return {
+        "NoteID": "bench-note",
+        "Date": "2024-05-01",
+        "Products": [{"ProductID": f"P{n:06d}", "Quantity": n % 97 + 1} for n in range(lines)],
+    }
+
+
+def load_writer(mode):
+    """
+    Importa el escritor de `mode` y devuelve (writer, segundos de import).
+    """
+    started = time.perf_counter()
+    if mode == "native":
+        os.environ["NOTE_WORKBOOK_WRITER"] = "native"
+        from workbooks import write_note_workbook as writer
+    elif mode == "write-only":
+        # workbooks importa openpyxl en la primera escritura: se fuerza aquí
+        # para que cuente como coste de import y no de escritura
+        os.environ["NOTE_WORKBOOK_WRITER"] = "openpyxl"
+        from workbooks import write_note_workbook as writer
+        import openpyxl  # noqa: F401
+    else:
+        from bench_note_file import write_note_workbook_legacy as writer
+    return writer, time.perf_counter() - started
+
+
+def child(mode, lines):
+    """
+    Una medida en este proceso; imprime el resultado como JSON.
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    writer, import_time = load_writer(mode)
+    note = make_note(lines)
+    output = io.BytesIO()
+    started = time.perf_counter()
+    writer(note, output)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss está en KB en Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "import": import_time,
+        "time": elapsed,
+        "peak_rss": peak,
+        "rss_growth": peak - baseline,
+        "size": len(output.getvalue()),
+    }))
+    sys.stdout.flush()
+    if os.environ.get("BENCH_DUMP"):
+        with open(os.environ["BENCH_DUMP"], "wb") as f:
+            f.write(output.getvalue())
+
+
+def run(mode, lines, dump=None):
+    env = dict(os.environ)
+    env.pop("NOTE_WORKBOOK_WRITER", None)
+    if dump:
+        env["BENCH_DUMP"] = dump
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, str(lines)],
+        env=env, cwd=SERVICE_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1, help="se informa la mejor de N ejecuciones")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "LINES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    from bench_note_file import rows
+
+    print(f"{'lines':>8} {'mode':>11} {'import (s)':>11} {'time (s)':>10} {'rss (MB)':>9} {'+rss (MB)':>10} {'size (KB)':>10}")
+    for size in args.sizes:
+        outputs = {}
+        for mode in MODES:
+            dump = os.path.join(SERVICE_DIR, f".bench_{mode}.xlsx")
+            best = None
+            for _ in range(args.repeat):
+                result = run(mode, size, dump=dump)
+                if best is None:
+                    best = result
+                else:
+                    best = {key: min(best[key], result[key]) for key in best}
+            with open(dump, "rb") as f:
+                outputs[mode] = f.read()
+            os.remove(dump)
+            print(
+                f"{size:>8} {mode:>11} {best['import']:>11.3f} {best['time']:>10.3f} "
+                f"{best['peak_rss'] / 1024:>9.1f} {best['rss_growth'] / 1024:>10.1f} {best['size'] / 1024:>10.1f}"
+            )
+        # Los tres escritores deben producir las mismas celdas
+        expected = rows(outputs["normal"])
+        for mode in MODES:
+            assert rows(outputs[mode]) == expected, f"{mode} workbook differs"
+
+
+if __name__ == "__main__":
+    main()
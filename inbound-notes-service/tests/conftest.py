@@ -0,0 +1,198 @@
+"""
+Fixtures comunes: DynamoDB con moto (tablas como en serverless.yml) y
+products-service sustituido por una sesión HTTP en memoria.
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+SERVICE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ENV = {
+    "AWS_ACCESS_KEY_ID": "test",
+    "AWS_SECRET_ACCESS_KEY": "test",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "DYNAMO_TABLE": "Test-Inbound-Notes",
+    "PRODUCTS_API_URL": "http://products.test/products",
+    "PRODUCTS_TABLE": "Test-Products",
+    "PRODUCTS_INDEX_TABLE": "Test-Products-Index",
+    "MOVEMENTS_TABLE": "Test-Products-Movements",
+    "S3_BUCKET_NAME": "test-inbound-notes",
+    "NOTES_QUEUE_URL": "",
+}
+
+# Tabla: (clave, GSIs {nombre: clave})
+TABLES = {
+    "Test-Inbound-Notes": (("NoteID",), {"DateIndex": ("DateBucket", "Date")}),
+    "Test-Inbound-Notes-Journal": (("JournalID",), {}),
+    "Test-Products": (("ProductID",), {}),
+    "Test-Products-Index": (("PK", "SK"), {}),
+    "Test-Products-Movements": (("ProductID", "MovementKey"), {}),
+}
+
+
+def key_schema(key):
+    return [{"AttributeName": name, "KeyType": kind} for name, kind in zip(key, ("HASH", "RANGE"))]
+
+
+def create_tables():
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    for table_name, (key, indexes) in TABLES.items():
+        attributes = set(key).union(*indexes.values())
+        kwargs = {
+            "TableName": table_name,
+            "KeySchema": key_schema(key),
+            "AttributeDefinitions": [{"AttributeName": name, "AttributeType": "S"} for name in sorted(attributes)],
+            "BillingMode": "PAY_PER_REQUEST",
+        }
+        if indexes:
+            kwargs["GlobalSecondaryIndexes"] = [
+                {"IndexName": name, "KeySchema": key_schema(index_key), "Projection": {"ProjectionType": "ALL"}}
+                for name, index_key in indexes.items()
+            ]
+        client.create_table(**kwargs)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+
+
+class FakeAdapter:
+    """
+    Adaptador sin pools: `opened_connections()` devuelve 0.
+    """
+
+    class poolmanager:
+        pools = {}
+
+
+class FakeProducts:
+    """
+    products-service en memoria:
+    - PUT /products/{id} con {"Quantity": delta}: no deja el stock por
+      debajo de 0 salvo con X-Stock-Compensation, y no repite una
+      Idempotency-Key ya aplicada.
+    - POST /products/adjustments: todo o nada, con Idempotency-Key.
+    `fail_next` respuestas aplican y devuelven 502 (resultado desconocido) y
+    `delays` ({ProductID: s}) retrasa la respuesta tras aplicar el PUT.
+    """
+
+    def __init__(self, stock):
+        self.stock = dict(stock)
+        self.keys = set()
+        self.calls = []
+        self.fail_next = 0
+        self.delays = {}
+        self._lock = threading.Lock()
+
+    def get_adapter(self, url):
+        return FakeAdapter
+
+    def _applied(self, key):
+        if self.fail_next:
+            self.fail_next -= 1
+            return FakeResponse(502, {"message": "Bad Gateway"})
+        return FakeResponse(200, {"message": "Applied"})
+
+    def put(self, url, json=None, headers=None, timeout=None):
+        headers = headers or {}
+        product_id = url.rsplit("/", 1)[1]
+        key = headers.get("Idempotency-Key")
+        delta = json["Quantity"]
+        with self._lock:
+            self.calls.append(("PUT", key, product_id, delta))
+            if key is not None and key in self.keys:
+                return FakeResponse(200, {"message": "Product updated successfully!", "Replayed": True})
+            if product_id not in self.stock:
+                return FakeResponse(404, {"message": "Product not found"})
+            if self.stock[product_id] + delta < 0 and headers.get("X-Stock-Compensation") != "true":
+                return FakeResponse(400, {"errors": ["Resulting 'Quantity' cannot be less than 0."]})
+            self.stock[product_id] += delta
+            self.keys.add(key)
+            response = self._applied(key)
+        time.sleep(self.delays.get(product_id, 0))
+        return response
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        key = (headers or {}).get("Idempotency-Key")
+        with self._lock:
+            self.calls.append(("POST", key, json["Adjustments"]))
+            if key is not None and key in self.keys:
+                return FakeResponse(200, {"message": "Adjustments applied successfully!", "Replayed": True})
+            missing = [line["ProductID"] for line in json["Adjustments"] if line["ProductID"] not in self.stock]
+            if missing:
+                return FakeResponse(400, {"message": "No adjustments were applied.", "failures": missing})
+            for line in json["Adjustments"]:
+                self.stock[line["ProductID"]] += line["delta"]
+            self.keys.add(key)
+            return self._applied(key)
+
+
+class Context:
+    """
+    Contexto de Lambda con `remaining_ms` de tiempo desde su creación.
+    """
+
+    def __init__(self, remaining_ms=30000):
+        self.deadline = time.monotonic() + remaining_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+@pytest.fixture
+def products():
+    return FakeProducts({"P1": 10, "P2": 10})
+
+
+@pytest.fixture
+def load_handler(monkeypatch, products):
+    """
+    Importa handler.py con ENV más las variables dadas, sobre tablas vacías.
+    """
+    for name, value in ENV.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.syspath_prepend(SERVICE_DIR)
+    mock = mock_aws()
+    mock.start()
+    create_tables()
+
+    def load(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        sys.modules.pop("handler", None)
+        handler = importlib.import_module("handler")
+        monkeypatch.setattr(handler, "http", lambda: products)
+        return handler
+
+    yield load
+    sys.modules.pop("handler", None)
+    mock.stop()
+
+
+@pytest.fixture
+def service(load_handler, products):
+    """
+    Servicio en modo "async" (cola en memoria).
+    """
+    return load_handler(NOTES_INGEST_MODE="async"), products
+
+
+@pytest.fixture
+def sync_service(load_handler, products):
+    """
+    Servicio en modo "sync" con NOTES_COMMIT_MODE="http".
+    """
+    return load_handler(NOTES_INGEST_MODE="sync", NOTES_COMMIT_MODE="http"), products
@@ -0,0 +1,110 @@
+"""
+Diario del modo "http": reversión de una nota fallida y barrido de lo que
+no se pudo resolver dentro de la invocación.
+"""
+import json
+import time
+
+from conftest import Context
+
+
+def create_note(handler, products, context):
+    return handler.create_inbound_note(
+        {"body": json.dumps({"Date": "2024-05-02", "Products": products})}, context
+    )
+
+
+def journals(handler):
+    return handler.journal_table.scan()["Items"]
+
+
+def test_calls_cut_by_the_deadline_stay_unknown_until_the_sweep(load_handler, products):
+    handler = load_handler(NOTES_INGEST_MODE="sync", NOTES_COMMIT_MODE="http", PRODUCTS_FANOUT_WIDTH="1")
+    # P1 se aplica pero responde después del plazo; P2 no llega a enviarse
+    products.delays["P1"] = 1.5
+
+    response = create_note(
+        handler, [{"ProductID": "P1", "Quantity": 5}, {"ProductID": "P2", "Quantity": 3}], Context(2000)
+    )
+
+    assert response["statusCode"] == 400
+    assert products.stock == {"P1": 15, "P2": 10}
+    [journal] = journals(handler)
+    assert journal["Applied"] == {} and journal["Rejected"] == {}
+
+    # El barrido repite las líneas con su clave y revierte lo aplicado
+    time.sleep(products.delays.pop("P1"))
+    handler.JOURNAL_SWEEP_AGE_SECONDS = -1
+    result = json.loads(handler.sweep_inbound_note_journal({}, None)["body"])
+
+    assert result == {"swept": 1, "repaired": 1, "pending": 0}
+    assert products.stock == {"P1": 10, "P2": 10}
+    assert journals(handler) == []
+    assert handler.table.scan()["Items"] == []
+
+
+def test_rejected_line_reverts_the_applied_ones(sync_service):
+    handler, products = sync_service
+
+    response = create_note(
+        handler, [{"ProductID": "P1", "Quantity": 5}, {"ProductID": "MISSING", "Quantity": 1}], Context()
+    )
+
+    assert response["statusCode"] == 400
+    assert products.stock == {"P1": 10, "P2": 10}
+    assert journals(handler) == []
+    # Un solo PUT por clave: aplicar P1, rechazo de MISSING, revertir P1
+    assert sorted(key.rsplit("#", 2)[1:] for _, key, _, _ in products.calls) == [
+        ["0", "apply"], ["0", "revert"], ["1", "apply"],
+    ]
+
+
+def test_revert_does_not_hit_the_stock_floor(load_handler, products):
+    handler = load_handler(NOTES_INGEST_MODE="sync", NOTES_COMMIT_MODE="http", PRODUCTS_FANOUT_WIDTH="1")
+    products.delays["P1"] = 1.5
+    response = create_note(
+        handler, [{"ProductID": "P1", "Quantity": 5}, {"ProductID": "P2", "Quantity": 3}], Context(2000)
+    )
+    assert response["statusCode"] == 400
+    time.sleep(products.delays.pop("P1"))
+
+    # Mientras el diario sigue abierto se venden 13 de las 15 unidades de P1
+    products.stock["P1"] = 2
+    handler.JOURNAL_SWEEP_AGE_SECONDS = -1
+    result = json.loads(handler.sweep_inbound_note_journal({}, None)["body"])
+
+    assert result == {"swept": 1, "repaired": 1, "pending": 0}
+    assert products.stock == {"P1": -3, "P2": 10}
+    assert journals(handler) == []
+
+
+def test_movements_failure_keeps_the_note_and_the_sweep_rebuilds_them(sync_service, monkeypatch):
+    handler, products = sync_service
+    record_movements = handler.record_movements
+
+    def failing(*args, **kwargs):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(handler, "record_movements", failing)
+    response = create_note(handler, [{"ProductID": "P1", "Quantity": 5}], Context())
+
+    # La nota y el stock quedan aplicados aunque falten sus movimientos
+    assert response["statusCode"] == 201
+    assert products.stock["P1"] == 15
+    [repair] = journals(handler)
+    assert repair["JournalID"].startswith(handler.MOVEMENTS_PREFIX)
+    assert handler.movements_table.scan()["Items"] == []
+
+    monkeypatch.setattr(handler, "record_movements", record_movements)
+    handler.JOURNAL_SWEEP_AGE_SECONDS = -1
+    for _ in range(2):
+        # Repetir la reparación no suma dos veces
+        handler.journal_table.put_item(Item=repair)
+        result = json.loads(handler.sweep_inbound_note_journal({}, None)["body"])
+        assert result == {"swept": 1, "repaired": 1, "pending": 0}
+
+    [movement] = handler.movements_table.scan()["Items"]
+    assert movement["Delta"] == 5
+    total = handler.products_index_table.get_item(Key=handler.kardex_total_key("P1", "2024-05"))["Item"]
+    assert total["Net"] == 5
+    assert journals(handler) == []
@@ -0,0 +1,52 @@
+"""
+Saldos del kardex con notas y cambios de stock hechos fuera de ellas.
+"""
+import json
+
+from conftest import Context
+
+
+def create_note(handler, date, quantity):
+    response = handler.create_inbound_note(
+        {"body": json.dumps({"Date": date, "Products": [{"ProductID": "P1", "Quantity": quantity}]})}, Context()
+    )
+    assert response["statusCode"] == 201
+
+
+def product_change(handler, date, delta):
+    """
+    Movimiento PRODUCT y total como los escribe el stream de products-service.
+    """
+    handler.movements_table.put_item(Item={
+        "ProductID": "P1", "MovementKey": f"{date}#PRODUCT#{date}", "Date": date,
+        "NoteType": "PRODUCT", "Quantity": abs(delta), "Delta": delta,
+    })
+    handler.products_index_table.update_item(
+        Key={"PK": "KARDEX#P1", "SK": f"{date[:7]}#PRODUCT"},
+        UpdateExpression="ADD Net :delta",
+        ExpressionAttributeValues={":delta": delta},
+    )
+
+
+def get_kardex(handler, **params):
+    response = handler.get_kardex({"pathParameters": {"product_id": "P1"}, "queryStringParameters": params}, None)
+    body = json.loads(response["body"])
+    return body["OpeningBalance"], [row["Balance"] for row in body["Movements"]], body["ClosingBalance"]
+
+
+def test_balances_include_direct_changes_and_ignore_later_ones(sync_service):
+    handler, products = sync_service
+    # Stock anterior al historial (reindexProducts)
+    handler.products_index_table.put_item(Item={"PK": "KARDEX#P1", "SK": "0000-00#OPENING", "Net": 10})
+    create_note(handler, "2024-05-02", 5)
+    product_change(handler, "2024-05-10T12:00:00", -4)
+    create_note(handler, "2024-06-01", 3)
+
+    assert get_kardex(handler) == (10, [15, 11, 14], 14)
+    assert get_kardex(handler, **{"from": "2024-05-05"}) == (15, [11, 14], 14)
+    assert get_kardex(handler, **{"from": "2024-06-01"}) == (11, [14], 14)
+
+    # Un PUT posterior no cambia los saldos de junio
+    product_change(handler, "2024-07-03T09:00:00", 100)
+    assert get_kardex(handler, **{"from": "2024-06-01", "to": "2024-06-30"}) == (11, [14], 14)
+    assert get_kardex(handler, **{"from": "2024-07-01"}) == (14, [114], 114)
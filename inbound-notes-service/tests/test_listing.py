@@ -0,0 +1,75 @@
+"""
+Listado por rango de fechas sobre DateIndex: páginas entre meses, rango
+máximo y cursores manipulados.
+"""
+import base64
+import json
+
+import pytest
+
+DATES = ["2024-01-05", "2024-01-20", "2024-03-02", "2024-03-03", "2024-03-30", "2024-05-01"]
+
+
+@pytest.fixture
+def notes(sync_service):
+    handler, _ = sync_service
+    for position, date in enumerate(DATES):
+        handler.table.put_item(Item={
+            "NoteID": f"N{position}", "Date": date, "Products": [], **handler.date_index_attributes(date),
+        })
+    return handler
+
+
+def list_notes(handler, **params):
+    response = handler.get_all_inbound_notes({"queryStringParameters": params}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def encode(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def test_pages_follow_date_order_across_months(notes):
+    dates, cursor = [], None
+    while True:
+        params = {"from": "2024-01-01", "to": "2024-04-30", "limit": "2"}
+        if cursor:
+            params["cursor"] = cursor
+        status, body = list_notes(notes, **params)
+        assert status == 200
+        dates.extend(note["Date"] for note in body["Items"])
+        cursor = body["NextCursor"]
+        if cursor is None:
+            break
+
+    assert dates == DATES[:5]
+
+
+def test_full_listing_reads_every_month(notes):
+    status, body = list_notes(notes, **{"from": "2024-01-10", "to": "2024-12-31"})
+
+    assert status == 200
+    assert [note["Date"] for note in body] == DATES[1:]
+
+
+def test_date_range_is_capped(notes):
+    status, body = list_notes(notes, **{"from": "1900-01-01", "to": "2024-01-01"})
+
+    assert status == 400
+    assert body["errors"] == [f"The date range must not span more than {notes.MAX_DATE_RANGE_MONTHS} months."]
+
+
+@pytest.mark.parametrize("cursor", [
+    {"Bucket": 2024},
+    {"Bucket": "2024-13"},
+    {"Bucket": "2024-03", "Key": "N2"},
+    {"Bucket": "2024-03", "Key": {"NoteID": "N2", "DateBucket": "2024-03"}},
+    {"Bucket": "2024-03", "Key": {"NoteID": "N2", "DateBucket": "2024-03", "Date": 5}},
+    {"Bucket": "2024-03", "Key": {"NoteID": "N2", "DateBucket": "2024-01", "Date": "2024-03-02"}},
+    {"Bucket": "2024-03", "Key": {"NoteID": "N2", "DateBucket": "2024-03", "Date": "2024-03-02", "X": "1"}},
+])
+def test_tampered_cursor_is_rejected(notes, cursor):
+    status, body = list_notes(notes, **{"from": "2024-01-01", "to": "2024-04-30", "cursor": encode(cursor)})
+
+    assert status == 400
+    assert body["errors"] == ["Invalid cursor."]
@@ -0,0 +1,80 @@
+"""
+Worker de la cola de notas con LocalNoteQueue: alta en modo "async",
+worker y estado de la nota.
+"""
+import json
+
+def create_note(handler, products):
+    response = handler.create_inbound_note(
+        {"body": json.dumps({"Date": "2024-05-02", "Products": products})}, None
+    )
+    assert response["statusCode"] == 202
+    return json.loads(response["body"])["NoteID"]
+
+
+def note_status(handler, note_id):
+    response = handler.get_inbound_note_status({"pathParameters": {"note_id": note_id}}, None)
+    return json.loads(response["body"])
+
+
+def test_worker_applies_the_batch_in_one_call(service):
+    handler, products = service
+    first = create_note(handler, [{"ProductID": "P1", "Quantity": 2}])
+    second = create_note(handler, [{"ProductID": "P1", "Quantity": 3}, {"ProductID": "P2", "Quantity": 1}])
+    assert note_status(handler, first)["Status"] == "PENDING"
+
+    result = handler.process_inbound_note_queue(handler.note_queue().receive_event(10), None)
+
+    assert result == {"batchItemFailures": []}
+    assert [note_status(handler, note_id)["Status"] for note_id in (first, second)] == ["APPLIED", "APPLIED"]
+    assert products.stock == {"P1": 15, "P2": 11}
+    assert len(products.calls) == 1
+    assert handler.journal_table.scan()["Items"] == []
+
+
+def test_rejected_batch_is_retried_note_by_note(service):
+    handler, products = service
+    good = create_note(handler, [{"ProductID": "P1", "Quantity": 2}])
+    bad = create_note(handler, [{"ProductID": "MISSING", "Quantity": 1}])
+
+    result = handler.process_inbound_note_queue(handler.note_queue().receive_event(10), None)
+
+    assert result == {"batchItemFailures": []}
+    assert note_status(handler, good)["Status"] == "APPLIED"
+    status = note_status(handler, bad)
+    assert status["Status"] == "FAILED"
+    assert "MISSING" in status["Error"]
+    assert products.stock == {"P1": 12, "P2": 10}
+    # Lote conjunto rechazado y luego una llamada por nota, cada una con su clave
+    assert len(products.calls) == 3
+    assert len({key for _, key, _ in products.calls}) == 3
+    assert handler.journal_table.scan()["Items"] == []
+
+
+def test_unknown_outcome_is_replayed_with_the_same_key(service):
+    handler, products = service
+    note_id = create_note(handler, [{"ProductID": "P1", "Quantity": 2}])
+    event = handler.note_queue().receive_event(10)
+    products.fail_next = 1
+
+    result = handler.process_inbound_note_queue(event, None)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": event["Records"][0]["messageId"]}]}
+    assert note_status(handler, note_id)["Status"] == "APPLYING"
+    assert len(handler.journal_table.scan()["Items"]) == 1
+
+    # Con el lease vigente otra entrega del mensaje no la toma
+    assert handler.process_inbound_note_queue(event, None) == {"batchItemFailures": []}
+    assert len(products.calls) == 1
+
+    # Con el lease vencido la reentrega repite el mismo lote: no se aplica dos veces
+    handler.table.update_item(
+        Key={"NoteID": note_id},
+        UpdateExpression="SET LeaseUntil = :expired",
+        ExpressionAttributeValues={":expired": 0},
+    )
+    assert handler.process_inbound_note_queue(event, None) == {"batchItemFailures": []}
+    assert note_status(handler, note_id)["Status"] == "APPLIED"
+    assert products.stock["P1"] == 12
+    assert [key for _, key, _ in products.calls] == [products.calls[0][1]] * 2
+    assert handler.journal_table.scan()["Items"] == []
@@ -0,0 +1,73 @@
+from decouple import config
+
+from xlsx_writer import write_xlsx
+
+# Subir al cambiar el contenido o formato de los libros de nota: invalida los
+# archivos ya generados en S3 (ver note_file_hash en handler.py)
+NOTE_WORKBOOK_VERSION = 1
+
+# "native": xlsx_writer (sin dependencias, inlineStr).
+# "openpyxl": modo write-only de openpyxl, que solo se importa en este caso.
+# Ambos producen las mismas celdas.
+NOTE_WORKBOOK_WRITER = config("NOTE_WORKBOOK_WRITER", default="native")
+
+
+def write_rows(sheet_name, rows, output):
+    """
+    Escribe las filas (lista o generador) en una hoja con el escritor
+    configurado.
+    """
+    if NOTE_WORKBOOK_WRITER != "openpyxl":
+        write_xlsx(output, sheet_name, rows)
+        return
+
+    import openpyxl
+
+    # Modo write-only: cada fila se serializa directamente al zip y no se
+    # crean objetos Cell
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for row in rows:
+        ws.append(row)
+    wb.save(output)
+
+
+def note_rows(note):
+    """
+    NoteID y Date en A1:B2, una fila en blanco, la cabecera ProductID /
+    Quantity y una fila por producto.
+    """
+    yield ['NoteID', note.get('NoteID')]
+    yield ['Date', note.get('Date')]
+    yield []
+    yield ['ProductID', 'Quantity']
+    for product in note.get('Products', []):
+        yield [product.get('ProductID'), product.get('Quantity')]
+
+
+def write_note_workbook(note, output):
+    """
+    Escribe en `output` el libro de una nota. Las filas se generan a medida
+    que se escriben, así que el tiempo y la memoria no crecen con el número
+    de líneas retenidas.
+    """
+    write_rows('Note Details', note_rows(note), output)
+
+
+def kardex_rows(product_id, date_from, date_to, opening, rows):
+    yield ['ProductID', product_id]
+    yield ['From', date_from]
+    yield ['To', date_to]
+    yield ['Opening balance', opening]
+    yield []
+    yield ['Date', 'NoteType', 'NoteID', 'Quantity', 'Delta', 'Balance']
+    for row in rows:
+        yield [row['Date'], row['NoteType'], row['NoteID'], row['Quantity'], row['Delta'], row['Balance']]
+
+
+def write_kardex_workbook(product_id, date_from, date_to, opening, rows, output):
+    """
+    Escribe en `output` el kardex de un producto. `rows` puede ser un
+    generador: las filas se consumen a medida que se escriben.
+    """
+    write_rows('Kardex', kardex_rows(product_id, date_from, date_to, opening, rows), output)
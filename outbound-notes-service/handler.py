@@ -1,15 +1,22 @@
 import json
 import boto3
-import requests
 import os
-import openpyxl
 import io
 import base64
+import hashlib
+import time
+import threading
 
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, wait
 from decimal import Decimal
 from uuid import uuid4
 from datetime import datetime
 from decouple import config
+from note_queue import make_note_queue
+from workbooks import NOTE_WORKBOOK_VERSION, write_note_workbook
 
 # Configuración DynamoDB
 AWS_REGION = "us-east-1"
@@ -17,9 +24,149 @@ DYNAMO_TABLE = config("DYNAMO_TABLE")
 PRODUCTS_API_URL = config("PRODUCTS_API_URL")
 BUCKET_NAME = os.environ['S3_BUCKET_NAME']
 
+# "http": cada ajuste de stock pasa por la API de products-service.
+# "direct": la nota y los ajustes se escriben en una sola TransactWriteItems.
+NOTES_COMMIT_MODE = config("NOTES_COMMIT_MODE", default="http")
+PRODUCTS_TABLE = config("PRODUCTS_TABLE", default="Products-Dev")
+PRODUCTS_INDEX_TABLE = config("PRODUCTS_INDEX_TABLE", default="Products-Index-Dev")
+# Movimientos por producto (tabla de products-service): un item por producto
+# y nota, con clave de orden "{Date}#{NoteType}#{NoteID}"
+MOVEMENTS_TABLE = config("MOVEMENTS_TABLE", default="Products-Movements-Dev")
+# Totales mensuales de movimientos por producto y tipo (puntos de control
+# del kardex), en la tabla auxiliar de products-service
+KARDEX_PREFIX = "KARDEX#"
+NOTE_TYPE = "OUTBOUND"
+# Una nota de salida resta stock
+STOCK_DIRECTION = -1
+# GSI de listado por fecha: partición DateBucket (mes, YYYY-MM) y orden Date
+DATE_INDEX = "DateIndex"
+# Atributos derivados que no se devuelven al cliente
+INTERNAL_ATTRIBUTES = ("DateBucket",)
+MAX_PAGE_LIMIT = 1000
+# Meses (particiones de DateIndex) que puede abarcar un listado por fechas:
+# cada mes es un Query
+MAX_DATE_RANGE_MONTHS = config("MAX_DATE_RANGE_MONTHS", default=120, cast=int)
+# Queries simultáneos por mes de un listado por fechas sin `limit`
+DATE_QUERY_WIDTH = config("DATE_QUERY_WIDTH", default=8, cast=int)
+# Máximo de operaciones por TransactWriteItems
+TRANSACT_WRITE_LIMIT = 100
+# Diario de ajustes aplicados en modo "http", para revertir notas a medias
+JOURNAL_TABLE = config("JOURNAL_TABLE", default=f"{DYNAMO_TABLE}-Journal")
+# Antigüedad mínima (s) de un diario abierto para que el barrido lo revierta;
+# debe superar el timeout de las funciones de notas
+JOURNAL_SWEEP_AGE_SECONDS = config("JOURNAL_SWEEP_AGE_SECONDS", default=900, cast=int)
+# "sync": la nota se aplica dentro de la petición.
+# "async": se guarda como PENDING, se encola y la aplica el worker (202).
+NOTES_INGEST_MODE = config("NOTES_INGEST_MODE", default="sync")
+# Sin URL se usa una cola en memoria (ejecución local)
+NOTES_QUEUE_URL = config("NOTES_QUEUE_URL", default="")
+# Lease (s) de una nota APPLYING: vencido, la reentrega del mensaje o el
+# barrido pueden retomarla. Debe superar el timeout del worker y quedar por
+# debajo del VisibilityTimeout de la cola.
+NOTE_LEASE_SECONDS = config("NOTE_LEASE_SECONDS", default=900, cast=int)
+# Lotes del worker en la tabla de diarios (JournalID=BATCH#<id>)
+BATCH_PREFIX = "BATCH#"
+# Movimientos de una nota guardada que no se pudieron escribir
+# (JournalID=MOVEMENTS#<id>); el barrido los rehace
+MOVEMENTS_PREFIX = "MOVEMENTS#"
+# Generación anticipada de los xlsx de nota:
+# "stream": la función del stream de DynamoDB los genera tras cada escritura.
+# "inline": sustituto local del stream, en un hilo del propio proceso.
+# "off": solo se generan al descargarlos.
+NOTE_FILE_PRECOMPUTE = config("NOTE_FILE_PRECOMPUTE", default="stream")
+# Tamaño máximo del xlsx que se devuelve directamente en la respuesta de
+# Lambda (base64, isBase64Encoded) cuando el cliente lo pide con Accept; los
+# mayores se suben a S3 y se sirve la URL firmada. El límite de respuesta de
+# Lambda es 6 MB y base64 ocupa 4/3 del original.
+NOTE_FILE_INLINE_MAX_BYTES = config("NOTE_FILE_INLINE_MAX_BYTES", default=1048576, cast=int)
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def lazy_singleton(factory):
+    """
+    Devuelve una función que crea el objeto con `factory` la primera vez que
+    se llama (una sola vez aunque la llamen varios hilos) y luego lo reutiliza
+    entre invocaciones en caliente.
+    """
+    lock = threading.Lock()
+    instance = []
+
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    return get
+
 
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
 table = dynamodb.Table(DYNAMO_TABLE)
+journal_table = dynamodb.Table(JOURNAL_TABLE)
+movements_table = dynamodb.Table(MOVEMENTS_TABLE)
+products_index_table = dynamodb.Table(PRODUCTS_INDEX_TABLE)
+products_table = dynamodb.Table(PRODUCTS_TABLE)
+# Los clientes que solo usan algunas funciones se crean en el primer uso
+# (ver lazy_singleton): así los CRUD no pagan en el arranque en frío el
+# modelo de S3 ni el import de requests
+note_queue = lazy_singleton(lambda: make_note_queue(NOTES_QUEUE_URL, region_name=AWS_REGION))
+s3_client = lazy_singleton(lambda: boto3.client("s3", region_name=AWS_REGION))
+# Hilo de fondo del modo NOTE_FILE_PRECOMPUTE=inline
+file_executor = ThreadPoolExecutor(max_workers=1)
+# Queries por mes de los listados por fechas completos
+date_query_executor = ThreadPoolExecutor(max_workers=DATE_QUERY_WIDTH)
+
+# Sesión HTTP hacia products-service: el pool de conexiones de urllib3 vive a
+# nivel de módulo y se reutiliza entre invocaciones en caliente (keep-alive).
+PRODUCTS_POOL_SIZE = config("PRODUCTS_POOL_SIZE", default=10, cast=int)
+PRODUCTS_TIMEOUT_SECONDS = config("PRODUCTS_TIMEOUT_SECONDS", default=10, cast=float)
+PRODUCTS_CONNECT_TIMEOUT_SECONDS = 3.05
+# Tiempo que se reserva al final de la invocación para guardar y responder
+DEADLINE_MARGIN_MS = config("DEADLINE_MARGIN_MS", default=1000, cast=int)
+# Llamadas simultáneas a products-service por nota
+PRODUCTS_FANOUT_WIDTH = config("PRODUCTS_FANOUT_WIDTH", default=8, cast=int)
+
+
+def products_session():
+    """
+    Sesión de requests hacia products-service. requests se importa aquí:
+    solo lo necesitan las escrituras en modo "http" y el worker de la cola.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Una conexión del pool por hilo del fan-out
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(PRODUCTS_POOL_SIZE, PRODUCTS_FANOUT_WIDTH))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+http = lazy_singleton(products_session)
+
+# Contadores del contenedor para la tasa de reutilización de conexiones
+http_stats = {"calls": 0, "new_connections": 0}
+_http_stats_lock = threading.Lock()
+
+fanout_executor = ThreadPoolExecutor(max_workers=PRODUCTS_FANOUT_WIDTH)
+
+# Detalle de las llamadas que seguían en curso al agotarse el tiempo: no se
+# sabe si products-service llegó a aplicarlas
+CALL_NOT_COMPLETED = "Lambda time budget exhausted before the call completed."
+# Detalle de las llamadas que no llegaron a enviarse por falta de tiempo
+CALL_NOT_SENT = "Lambda time budget exhausted before the call."
+
+# Resultado de una llamada a products-service. Solo una respuesta 4xx
+# asegura que no se aplicó (CALL_REJECTED); un timeout, una conexión
+# cortada, un 5xx o no llegar a enviarla dejan el resultado desconocido y la
+# línea se repite después con su misma Idempotency-Key.
+CALL_APPLIED = "applied"
+CALL_REJECTED = "rejected"
+CALL_UNKNOWN = "unknown"
+# 4xx que no son un rechazo definitivo (timeout, petición en curso, throttling)
+RETRYABLE_STATUSES = (408, 409, 429)
 
 
 def decimal_to_serializable(obj):
@@ -32,6 +179,1167 @@ def decimal_to_serializable(obj):
     return obj
 
 
+def remaining_seconds(context):
+    """
+    Segundos que quedan de la invocación menos DEADLINE_MARGIN_MS, o None sin
+    contexto de Lambda (sin límite).
+    """
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    return (context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS) / 1000
+
+
+def request_timeout(context):
+    """
+    Timeout (connect, read) de una llamada a products-service: el configurado,
+    recortado a lo que queda de la invocación menos DEADLINE_MARGIN_MS.
+    Devuelve None si ya no queda tiempo.
+    """
+    timeout = PRODUCTS_TIMEOUT_SECONDS
+    remaining = remaining_seconds(context)
+    if remaining is not None:
+        if remaining <= 0:
+            return None
+        timeout = min(timeout, remaining)
+    return (min(PRODUCTS_CONNECT_TIMEOUT_SECONDS, timeout), timeout)
+
+
+def http_errors():
+    """
+    Excepción base de requests, sin importarlo en el arranque.
+    """
+    import requests
+
+    return requests.RequestException
+
+
+def opened_connections():
+    """
+    Conexiones abiertas hasta ahora por los pools de urllib3 de la sesión.
+    """
+    pools = http().get_adapter(PRODUCTS_API_URL).poolmanager.pools
+    return sum(pools[key].num_connections for key in pools.keys())
+
+
+def call_outcome(status):
+    """
+    CALL_APPLIED, CALL_REJECTED o CALL_UNKNOWN según el código HTTP de
+    products-service (None si no hubo respuesta).
+    """
+    if status == 200:
+        return CALL_APPLIED
+    if status is not None and 400 <= status < 500 and status not in RETRYABLE_STATUSES:
+        return CALL_REJECTED
+    return CALL_UNKNOWN
+
+
+def put_product_quantity(product_id, quantity, context, idempotency_key=None, compensation=False):
+    """
+    PUT {PRODUCTS_API_URL}/{product_id} con un ajuste de Quantity usando la
+    sesión compartida. Con `idempotency_key` products-service no aplica dos
+    veces la misma petición, así que repetirla es seguro. Con `compensation`
+    (reversiones del diario, siempre con clave) no comprueba el stock
+    mínimo. Devuelve (resultado, detalle) y registra latencia y si la
+    llamada abrió una conexión nueva.
+    """
+    timeout = request_timeout(context)
+    if timeout is None:
+        return CALL_UNKNOWN, CALL_NOT_SENT
+
+    url = f"{PRODUCTS_API_URL}/{product_id}"
+    # products-service no registra el cambio como movimiento PRODUCT: el
+    # movimiento es el de la nota
+    headers = {"X-Stock-Source": "note"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    if compensation:
+        headers["X-Stock-Compensation"] = "true"
+    connections_before = opened_connections()
+    started = time.perf_counter()
+    try:
+        response = http().put(
+            url, json={"Quantity": decimal_to_serializable(quantity)}, headers=headers, timeout=timeout
+        )
+        detail, status = response.text, response.status_code
+    except http_errors() as e:
+        detail, status = f"{type(e).__name__}: {e}", None
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    # Con llamadas en paralelo, una conexión nueva puede atribuirse a otro hilo;
+    # el total del contenedor sí es exacto.
+    new_connection = opened_connections() > connections_before
+    with _http_stats_lock:
+        http_stats["calls"] += 1
+        http_stats["new_connections"] += int(new_connection)
+        reuse_rate = 1 - http_stats["new_connections"] / http_stats["calls"]
+    print(json.dumps({
+        "products_call": product_id,
+        "status": status,
+        "latency_ms": round(latency_ms, 1),
+        "new_connection": new_connection,
+        "reuse_rate": round(reuse_rate, 4),
+    }))
+    return call_outcome(status), detail
+
+
+def put_product_quantities(adjustments, context, keys=None, on_applied=None, on_rejected=None, compensation=False):
+    """
+    Aplica en paralelo (hasta PRODUCTS_FANOUT_WIDTH llamadas a la vez) una
+    lista de ajustes [(ProductID, Quantity)], con la Idempotency-Key de
+    `keys` del mismo índice, y devuelve [(ProductID, resultado, detalle)] en
+    el mismo orden. Las llamadas que no terminan dentro del tiempo restante
+    de la invocación tienen resultado desconocido: el plazo es uno para todo
+    el fan-out, no el timeout de cada llamada (con más ajustes que
+    PRODUCTS_FANOUT_WIDTH las llamadas van en varias tandas).
+    `on_applied(índice)` y `on_rejected(índice)` se llaman desde el hilo en
+    cuanto se conoce el resultado de un ajuste. `compensation` se pasa a
+    cada PUT.
+    """
+    def apply(index, product_id, quantity):
+        outcome, detail = put_product_quantity(
+            product_id, quantity, context, keys[index] if keys else None, compensation
+        )
+        if outcome == CALL_APPLIED and on_applied is not None:
+            on_applied(index)
+        elif outcome == CALL_REJECTED and on_rejected is not None:
+            on_rejected(index)
+        return outcome, detail
+
+    futures = [
+        fanout_executor.submit(apply, index, product_id, quantity)
+        for index, (product_id, quantity) in enumerate(adjustments)
+    ]
+
+    deadline = remaining_seconds(context)
+    done, _ = wait(futures, timeout=None if deadline is None else max(deadline, 0))
+
+    results = []
+    for index, ((product_id, _quantity), future) in enumerate(zip(adjustments, futures)):
+        if future in done:
+            outcome, detail = future.result()
+        elif future.cancel():
+            # No llegó a empezar: no se envió, pero tampoco se rechazó
+            outcome, detail = CALL_UNKNOWN, CALL_NOT_SENT
+        else:
+            outcome, detail = CALL_UNKNOWN, CALL_NOT_COMPLETED
+        results.append((product_id, outcome, detail))
+    return results
+
+
+def stock_update(product_id, delta, allow_negative=False):
+    """
+    Operación `Update` de TransactWriteItems sobre la tabla de productos.
+    Salvo `allow_negative`, un delta negativo exige stock suficiente. Deja
+    una marca nueva en NoteWrite: el movimiento lo registra la nota, así que
+    el stream de productos no lo cuenta como movimiento PRODUCT.
+    """
+    condition = "attribute_exists(ProductID)"
+    values = {":delta": Decimal(delta), ":note_write": str(uuid4())}
+    if delta < 0 and not allow_negative:
+        condition += " AND Quantity >= :min"
+        values[":min"] = Decimal(-delta)
+    return {
+        "Update": {
+            "TableName": PRODUCTS_TABLE,
+            "Key": {"ProductID": product_id},
+            "UpdateExpression": "ADD Quantity :delta SET NoteWrite = :note_write",
+            "ConditionExpression": condition,
+            "ExpressionAttributeValues": values,
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+    }
+
+
+def cancellation_failures(operations, error):
+    """
+    Traduce los CancellationReasons de una transacción cancelada a
+    [(ProductID, detalle)] para las operaciones de stock que fallaron.
+    """
+    deserializer = TypeDeserializer()
+    failures = []
+    for operation, reason in zip(operations, error.response.get("CancellationReasons", [])):
+        code = reason.get("Code", "None")
+        if code == "None":
+            continue
+        kind, params = next(iter(operation.items()))
+        if params["TableName"] != PRODUCTS_TABLE:
+            failures.append((None, reason.get("Message") or code))
+            continue
+        product_id = params["Key"]["ProductID"]
+        if code == "ConditionalCheckFailed" and "Item" not in reason:
+            failures.append((product_id, "Product not found"))
+        elif code == "ConditionalCheckFailed":
+            current = deserializer.deserialize(reason["Item"].get("Quantity", {"N": "0"}))
+            failures.append((
+                product_id,
+                f"Resulting 'Quantity' cannot be less than 0. Current Quantity: "
+                f"{decimal_to_serializable(current)}, Adjustment: {decimal_to_serializable(params['ExpressionAttributeValues'][':delta'])}",
+            ))
+        else:
+            failures.append((product_id, reason.get("Message") or code))
+    return failures or [(None, "Transaction cancelled")]
+
+
+def open_journal(adjustments, note_write):
+    """
+    Crea el diario de una operación de nota en modo "http" con los ajustes
+    previstos (`Lines`). Cada ajuste aplicado se marca en `Applied`, cada
+    rechazo definitivo (4xx) en `Rejected` y cada reversión en `Reverted`
+    (mapas índice -> True). Cada PUT lleva la Idempotency-Key de su línea
+    (`journal_line_key`), así que tanto aplicar como revertir se pueden
+    repetir. El diario se borra en la misma transacción que escribe la nota:
+    si sigue existiendo, la nota no se guardó.
+    """
+    kind, params = next(iter(note_write.items()))
+    journal_id = str(uuid4())
+    journal_table.put_item(Item={
+        "JournalID": journal_id,
+        "NoteID": params.get("Key", params.get("Item", {})).get("NoteID"),
+        "Operation": kind,
+        "Lines": [{"ProductID": product_id, "Quantity": quantity} for product_id, quantity in adjustments],
+        "Applied": {},
+        "Rejected": {},
+        "Reverted": {},
+        "CreatedAt": int(time.time()),
+    })
+    return journal_id
+
+
+def journal_line_key(journal_id, index, action):
+    """
+    Idempotency-Key del PUT de la línea `index` del diario: `action` es
+    "apply" o "revert".
+    """
+    return f"{journal_id}#{index}#{action}"
+
+
+def journal_mark(journal_id, field, index):
+    """
+    Marca la línea `index` del diario en `Applied`, `Rejected` o `Reverted`.
+    """
+    try:
+        journal_table.update_item(
+            Key={"JournalID": journal_id},
+            UpdateExpression="SET #field.#line = :true",
+            ConditionExpression="attribute_exists(JournalID)",
+            ExpressionAttributeNames={"#field": field, "#line": str(index)},
+            ExpressionAttributeValues={":true": True},
+        )
+    except ClientError as e:
+        # El ajuste ya está hecho en products-service; queda en el log para
+        # poder repararlo a mano
+        print(json.dumps({"journal_write_failed": journal_id, "field": field, "line": index,
+                          "error": e.response["Error"]["Code"]}))
+
+
+def compensate_journal(journal, context):
+    """
+    Deshace un diario en modo "http". Las líneas de resultado desconocido
+    (ni `Applied` ni `Rejected`) se repiten antes con su misma
+    Idempotency-Key: products-service no las aplica dos veces, así que
+    después se sabe si están aplicadas. Luego revierte las aplicadas y aún
+    no revertidas. Si todo queda resuelto borra el diario; si no, lo deja
+    para el barrido. Devuelve [(ProductID, detalle)] de lo que quedó
+    pendiente.
+    """
+    if journal.get("Mode") == "direct":
+        return compensate_direct_journal(journal)
+
+    journal_id = journal["JournalID"]
+    lines = journal["Lines"]
+    applied = set(journal.get("Applied", {}))
+    rejected = set(journal.get("Rejected", {}))
+
+    unknown = [index for index in range(len(lines)) if str(index) not in applied | rejected]
+    results = put_product_quantities(
+        [(lines[index]["ProductID"], lines[index]["Quantity"]) for index in unknown],
+        context,
+        keys=[journal_line_key(journal_id, index, "apply") for index in unknown],
+        on_applied=lambda position: journal_mark(journal_id, "Applied", unknown[position]),
+        on_rejected=lambda position: journal_mark(journal_id, "Rejected", unknown[position]),
+    )
+    unresolved = []
+    for index, (product_id, outcome, detail) in zip(unknown, results):
+        if outcome == CALL_APPLIED:
+            applied.add(str(index))
+        elif outcome == CALL_UNKNOWN:
+            unresolved.append((product_id, detail))
+
+    pending = [int(index) for index in applied if index not in journal.get("Reverted", {})]
+    results = put_product_quantities(
+        [(lines[index]["ProductID"], -lines[index]["Quantity"]) for index in pending],
+        context,
+        keys=[journal_line_key(journal_id, index, "revert") for index in pending],
+        on_applied=lambda position: journal_mark(journal_id, "Reverted", pending[position]),
+        # Como en el modo "direct", deshacer no exige stock suficiente: el
+        # stock pudo bajar desde que se aplicó la línea
+        compensation=True,
+    )
+    failures = [(product_id, detail) for product_id, outcome, detail in results if outcome != CALL_APPLIED]
+    closed = not failures and not unresolved
+    if closed:
+        journal_table.delete_item(Key={"JournalID": journal_id})
+    print(json.dumps({
+        "journal_compensated": journal_id,
+        "note": journal.get("NoteID"),
+        "replayed": len(unknown),
+        "reverted": len(pending) - len(failures),
+        "failed": len(failures),
+        "unresolved": len(unresolved),
+        "closed": closed,
+    }))
+    return failures + unresolved
+
+
+def revert_direct_chunk(journal_id, index, lines):
+    """
+    Revierte el bloque `index` de un diario en modo "direct" y lo marca en
+    `Reverted` en la misma transacción.
+    """
+    dynamodb.meta.client.transact_write_items(TransactItems=[
+        *(stock_update(line["ProductID"], -line["Quantity"], allow_negative=True) for line in lines),
+        {"Update": {
+            "TableName": JOURNAL_TABLE,
+            "Key": {"JournalID": journal_id},
+            "UpdateExpression": "SET Reverted.#chunk = :true",
+            "ConditionExpression": "attribute_exists(JournalID)",
+            "ExpressionAttributeNames": {"#chunk": str(index)},
+            "ExpressionAttributeValues": {":true": True},
+        }},
+    ])
+
+
+def compensate_direct_journal(journal):
+    """
+    Revierte los bloques aplicados y aún no revertidos de un diario en modo
+    "direct" y, si lo consigue, lo borra. Devuelve [(ProductID, detalle)] de
+    las líneas del bloque que no se pudo revertir.
+    """
+    journal_id = journal["JournalID"]
+    chunks = journal["Chunks"]
+    reverted = journal.get("Reverted", {})
+    pending = sorted((int(index) for index in journal.get("Applied", {}) if index not in reverted), reverse=True)
+    failures = []
+    done = 0
+    for index in pending:
+        try:
+            revert_direct_chunk(journal_id, index, chunks[index])
+        except ClientError as e:
+            detail = f"Revert failed: {e.response['Error']['Code']}"
+            failures = [(line["ProductID"], detail) for line in chunks[index]]
+            break
+        done += 1
+    if not failures:
+        journal_table.delete_item(Key={"JournalID": journal_id})
+    print(json.dumps({
+        "journal_compensated": journal_id,
+        "note": journal.get("NoteID"),
+        "mode": "direct",
+        "reverted": done,
+        "failed": len(failures),
+        "closed": not failures,
+    }))
+    return failures
+
+
+def commit_direct(adjustments, note_write):
+    """
+    Escribe la nota y todos los ajustes de stock directamente en DynamoDB con
+    TransactWriteItems. Si la nota supera el límite de la transacción se
+    trocea: la escritura de la nota va en el último bloque (la nota solo
+    existe si todo se aplicó) y, si un bloque falla, los anteriores se
+    revierten. Devuelve [(ProductID, detalle)] de los fallos.
+
+    Al trocear, los bloques se anotan en un diario (modo "direct") dentro de
+    su propia transacción, igual que las reversiones; el último bloque lo
+    borra. Si una reversión falla, o la invocación termina a medias, el
+    diario queda para el barrido.
+
+    Como los cambios de stock de products-service, no incrementa la versión
+    de su catálogo: su caché refleja el stock nuevo al caducar la entrada
+    (CACHE_TTL_SECONDS).
+    """
+    # Una transacción no puede tocar dos veces el mismo item
+    deltas = {}
+    for product_id, quantity in adjustments:
+        deltas[product_id] = deltas.get(product_id, 0) + quantity
+    operations = [stock_update(pid, delta) for pid, delta in deltas.items() if delta]
+    operations.append(note_write)
+
+    client = dynamodb.meta.client
+    if len(operations) <= TRANSACT_WRITE_LIMIT:
+        try:
+            client.transact_write_items(TransactItems=operations)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            return cancellation_failures(operations, e)
+        return []
+
+    # Cada bloque lleva además la operación sobre el diario
+    size = TRANSACT_WRITE_LIMIT - 1
+    chunks = [operations[start:start + size] for start in range(0, len(operations), size)]
+    kind, params = next(iter(note_write.items()))
+    journal_id = str(uuid4())
+    journal = {
+        "JournalID": journal_id,
+        "NoteID": params.get("Key", params.get("Item", {})).get("NoteID"),
+        "Operation": kind,
+        "Mode": "direct",
+        "Chunks": [
+            [
+                {"ProductID": op["Update"]["Key"]["ProductID"], "Quantity": op["Update"]["ExpressionAttributeValues"][":delta"]}
+                for op in chunk if op is not note_write
+            ]
+            for chunk in chunks
+        ],
+        "Applied": {},
+        "Reverted": {},
+        "CreatedAt": int(time.time()),
+    }
+    journal_table.put_item(Item=journal)
+
+    for index, chunk in enumerate(chunks):
+        if index == len(chunks) - 1:
+            journal_op = {"Delete": {"TableName": JOURNAL_TABLE, "Key": {"JournalID": journal_id}}}
+        else:
+            journal_op = {"Update": {
+                "TableName": JOURNAL_TABLE,
+                "Key": {"JournalID": journal_id},
+                "UpdateExpression": "SET Applied.#chunk = :true",
+                "ExpressionAttributeNames": {"#chunk": str(index)},
+                "ExpressionAttributeValues": {":true": True},
+            }}
+        try:
+            client.transact_write_items(TransactItems=[*chunk, journal_op])
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            journal["Applied"] = {str(previous): True for previous in range(index)}
+            compensate_direct_journal(journal)
+            return cancellation_failures(chunk, e)
+
+    return []
+
+
+def commit_note(adjustments, note_write, context):
+    """
+    Aplica los ajustes de stock [(ProductID, Quantity)] y la escritura de la
+    nota según NOTES_COMMIT_MODE. La nota solo se escribe si todos los
+    ajustes se aplicaron; en modo "http" los ajustes aplicados de una nota
+    fallida se revierten usando el diario. Devuelve [(ProductID, detalle)]
+    de los fallos.
+    """
+    if NOTES_COMMIT_MODE == "direct":
+        return commit_direct(adjustments, note_write)
+
+    journal_id = open_journal(adjustments, note_write)
+    results = put_product_quantities(
+        adjustments,
+        context,
+        keys=[journal_line_key(journal_id, index, "apply") for index in range(len(adjustments))],
+        on_applied=lambda index: journal_mark(journal_id, "Applied", index),
+        on_rejected=lambda index: journal_mark(journal_id, "Rejected", index),
+    )
+    failures = [(product_id, detail) for product_id, outcome, detail in results if outcome != CALL_APPLIED]
+    if failures:
+        # Revertir ya lo aplicado; lo que no se pueda queda para el barrido
+        journal = journal_table.get_item(Key={"JournalID": journal_id}, ConsistentRead=True)["Item"]
+        compensate_journal(journal, context)
+        return failures
+
+    # La nota y el cierre del diario, en una sola transacción
+    dynamodb.meta.client.transact_write_items(TransactItems=[
+        note_write,
+        {"Delete": {"TableName": JOURNAL_TABLE, "Key": {"JournalID": journal_id}}},
+    ])
+    return failures
+
+
+def date_index_attributes(date):
+    """
+    Atributos del índice DateIndex para una fecha ISO (YYYY-MM-DD...). Las
+    fechas con otro formato no se indexan y no aparecen en los listados por
+    rango.
+    """
+    try:
+        datetime.strptime(date[:10], "%Y-%m-%d")
+    except ValueError:
+        return {}
+    return {"DateBucket": date[:7]}
+
+
+def month_buckets(date_from, date_to):
+    """
+    Particiones DateBucket (YYYY-MM) de `date_from` a `date_to`, incluidas.
+    """
+    year, month = int(date_from[:4]), int(date_from[5:7])
+    last = (int(date_to[:4]), int(date_to[5:7]))
+    buckets = []
+    while (year, month) <= last:
+        buckets.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return buckets
+
+
+def strip_internal(note):
+    return {k: v for k, v in note.items() if k not in INTERNAL_ATTRIBUTES}
+
+
+def encode_cursor(last_evaluated_key):
+    """
+    Convierte un LastEvaluatedKey de DynamoDB en un token opaco para el cliente.
+    Devuelve None cuando no hay más páginas.
+    """
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(decimal_to_serializable(last_evaluated_key), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Inverso de `encode_cursor`. Lanza ValueError si el token no es válido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        key = json.loads(raw, parse_float=Decimal, parse_int=Decimal)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if not isinstance(key, dict) or not key:
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def parse_page_params(query_params):
+    """
+    Valida los parámetros `limit` y `cursor`. Devuelve (limit, start_key, errors);
+    limit es None cuando el cliente no pide paginación.
+    """
+    errors = []
+    limit = None
+    start_key = None
+
+    raw_limit = query_params.get("limit")
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            errors.append(f"Parameter 'limit' must be an integer between 1 and {MAX_PAGE_LIMIT}.")
+            limit = None
+
+    raw_cursor = query_params.get("cursor")
+    if raw_cursor:
+        try:
+            start_key = decode_cursor(raw_cursor)
+        except ValueError as e:
+            errors.append(str(e))
+
+    return limit, start_key, errors
+
+
+def parse_date_range(query_params):
+    """
+    Valida `from` / `to` (fechas ISO, ambos incluidos). Sin `to` se lista
+    hasta hoy. Devuelve (date_from, date_to, errors); date_from es None si no
+    se pide un rango.
+    """
+    errors = []
+    date_from = query_params.get("from")
+    date_to = query_params.get("to")
+    for name, value in (("from", date_from), ("to", date_to)):
+        if value is not None and not date_index_attributes(value):
+            errors.append(f"Parameter '{name}' must be an ISO date (YYYY-MM-DD).")
+    if errors:
+        return None, None, errors
+
+    if date_from is None:
+        if date_to is not None:
+            errors.append("Parameter 'from' is required when 'to' is given.")
+        return None, None, errors
+    if date_to is None:
+        date_to = datetime.utcnow().strftime("%Y-%m-%d")
+    if date_to[:10] < date_from[:10]:
+        errors.append("Parameter 'to' must not be earlier than 'from'.")
+    elif len(month_buckets(date_from, date_to)) > MAX_DATE_RANGE_MONTHS:
+        errors.append(f"The date range must not span more than {MAX_DATE_RANGE_MONTHS} months.")
+    return date_from, date_to, errors
+
+
+def valid_date_cursor(start):
+    """
+    True si `start` es una posición de `query_notes_by_date`: {"Bucket"} o
+    {"Bucket", "Key"} con la clave de DateIndex de ese mes.
+    """
+    bucket = start.get("Bucket")
+    if not isinstance(bucket, str) or len(bucket) != 7 or not date_index_attributes(f"{bucket}-01"):
+        return False
+    if set(start) == {"Bucket"}:
+        return True
+    key = start.get("Key")
+    return (
+        set(start) == {"Bucket", "Key"}
+        and isinstance(key, dict)
+        and set(key) == {"NoteID", "DateBucket", "Date"}
+        and all(isinstance(value, str) for value in key.values())
+        and key["DateBucket"] == bucket
+    )
+
+
+def paginate(read, limit=None, start_key=None, **kwargs):
+    """
+    Recorre `table.scan` / `table.query` siguiendo LastEvaluatedKey. Con
+    `limit` cada lectura pide solo los items que faltan para la página.
+    Devuelve (items, last_evaluated_key).
+    """
+    items = []
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+
+    while True:
+        if limit is not None:
+            kwargs["Limit"] = limit - len(items)
+        response = read(**kwargs)
+        items.extend(response.get("Items", []))
+
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key or (limit is not None and len(items) >= limit):
+            return items, last_key
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def query_notes_by_date(date_from, date_to, limit=None, start=None):
+    """
+    Notas con Date entre `date_from` y `date_to` (incluidos), en orden de
+    fecha, con un Query sobre DateIndex por cada mes del rango (como mucho
+    MAX_DATE_RANGE_MONTHS, ver parse_date_range). Sin `limit` hay que leer
+    todos los meses y se leen en paralelo, DATE_QUERY_WIDTH a la vez; con
+    `limit` se leen en orden y se para al completar la página. `start` es la
+    posición devuelta por la página anterior ({"Bucket", "Key"}).
+    Devuelve (items, siguiente posición o None).
+    """
+    buckets = month_buckets(date_from, date_to)
+    start_key = None
+    if start:
+        buckets = [bucket for bucket in buckets if bucket >= start["Bucket"]]
+        if buckets and buckets[0] == start["Bucket"]:
+            start_key = start.get("Key")
+
+    # Date puede llevar hora: el límite superior incluye todo el día `date_to`
+    condition = Key("Date").between(date_from, date_to + "\uffff")
+    if limit is None:
+        def read(position, bucket):
+            return paginate(
+                table.query,
+                start_key=start_key if position == 0 else None,
+                IndexName=DATE_INDEX,
+                KeyConditionExpression=Key("DateBucket").eq(bucket) & condition,
+            )[0]
+        pages = date_query_executor.map(read, range(len(buckets)), buckets)
+        return [item for page in pages for item in page], None
+
+    items = []
+    for position, bucket in enumerate(buckets):
+        page, last_key = paginate(
+            table.query,
+            limit=limit - len(items),
+            start_key=start_key if position == 0 else None,
+            IndexName=DATE_INDEX,
+            KeyConditionExpression=Key("DateBucket").eq(bucket) & condition,
+        )
+        items.extend(page)
+        if len(items) >= limit:
+            if last_key:
+                return items, {"Bucket": bucket, "Key": last_key}
+            if position + 1 < len(buckets):
+                return items, {"Bucket": buckets[position + 1]}
+            return items, None
+    return items, None
+
+
+def normalize_products(products):
+    """
+    Suma las líneas de una nota por ProductID, en orden de primera aparición.
+    La nota se guarda con sus líneas originales; el stock se ajusta con esta
+    forma normalizada ({ProductID: Quantity}).
+    """
+    totals = {}
+    for product in products:
+        totals[product["ProductID"]] = totals.get(product["ProductID"], 0) + product["Quantity"]
+    return totals
+
+
+def stock_adjustments(old_products, new_products):
+    """
+    Ajustes netos de stock [(ProductID, delta)] para pasar de las líneas
+    `old_products` a `new_products` (vacías al crear o al eliminar): uno por
+    producto distinto, sin deltas nulos y con el signo de STOCK_DIRECTION.
+    """
+    old_totals = normalize_products(old_products)
+    new_totals = normalize_products(new_products)
+    adjustments = []
+    # Orden estable: primero los productos de la nota original, luego los nuevos
+    for product_id in dict.fromkeys([*old_totals, *new_totals]):
+        delta = new_totals.get(product_id, 0) - old_totals.get(product_id, 0)
+        if delta:
+            adjustments.append((product_id, STOCK_DIRECTION * delta))
+    return adjustments
+
+
+def movement_key(product_id, date, note_id):
+    return {"ProductID": product_id, "MovementKey": f"{date}#{NOTE_TYPE}#{note_id}"}
+
+
+def kardex_total_key(product_id, month):
+    return {"PK": f"{KARDEX_PREFIX}{product_id}", "SK": f"{month}#{NOTE_TYPE}"}
+
+
+def movement_totals(note):
+    """
+    Efecto de una nota sobre el stock agrupado por (ProductID, mes). Las
+    notas sin fecha ISO no cuentan en los totales mensuales.
+    """
+    totals = {}
+    if note and date_index_attributes(note["Date"]):
+        month = note["Date"][:7]
+        for product_id, quantity in normalize_products(note["Products"]).items():
+            totals[(product_id, month)] = totals.get((product_id, month), 0) + STOCK_DIRECTION * quantity
+    return totals
+
+
+def record_movements(note_id, old_note, new_note, update_totals=True):
+    """
+    Sustituye en la tabla de movimientos los items de `old_note` por los de
+    `new_note` (None al crear o al eliminar la nota): uno por producto, con la
+    cantidad total de la nota y su efecto (`Delta`) sobre el stock. Con
+    `update_totals` también ajusta los totales mensuales del kardex.
+    """
+    # overwrite_by_pkeys: si la clave se borra y se vuelve a escribir gana la escritura
+    with movements_table.batch_writer(overwrite_by_pkeys=["ProductID", "MovementKey"]) as batch:
+        if old_note:
+            for product_id in normalize_products(old_note["Products"]):
+                batch.delete_item(Key=movement_key(product_id, old_note["Date"], note_id))
+        if new_note:
+            for product_id, quantity in normalize_products(new_note["Products"]).items():
+                batch.put_item(Item={
+                    **movement_key(product_id, new_note["Date"], note_id),
+                    "Date": new_note["Date"],
+                    "NoteID": note_id,
+                    "NoteType": NOTE_TYPE,
+                    "Quantity": quantity,
+                    "Delta": STOCK_DIRECTION * quantity,
+                })
+
+    if not update_totals:
+        return
+    changes = movement_totals(new_note)
+    for key, delta in movement_totals(old_note).items():
+        changes[key] = changes.get(key, 0) - delta
+    for (product_id, month), delta in changes.items():
+        if delta:
+            products_index_table.update_item(
+                Key=kardex_total_key(product_id, month),
+                UpdateExpression="ADD Net :delta",
+                ExpressionAttributeValues={":delta": delta},
+            )
+
+
+def record_note_movements(note_id, old_note, new_note):
+    """
+    `record_movements` tras guardar una nota. La nota y su stock ya están
+    aplicados, así que un fallo aquí no se propaga (la petición respondería
+    500 y el cliente repetiría la nota): se registra en el log y en el
+    diario para que el barrido rehaga los movimientos de la nota.
+    """
+    try:
+        record_movements(note_id, old_note, new_note)
+    except Exception as e:
+        repair = {
+            "JournalID": f"{MOVEMENTS_PREFIX}{uuid4()}",
+            "NoteID": note_id,
+            "CreatedAt": int(time.time()),
+        }
+        if old_note:
+            repair["OldNote"] = {"Date": old_note["Date"], "Products": old_note["Products"]}
+        print(json.dumps({"movements_failed": note_id, "error": f"{type(e).__name__}: {e}"}))
+        try:
+            journal_table.put_item(Item=repair)
+        except ClientError as journal_error:
+            # Sin diario solo lo arregla reindex_*_notes
+            print(json.dumps({"journal_write_failed": repair["JournalID"],
+                              "error": journal_error.response["Error"]["Code"]}))
+
+
+def repair_note_movements(repair):
+    """
+    Rehace los movimientos de la nota de un registro MOVEMENTS# del diario a
+    partir de la nota guardada (o sin ella, si se borró) y recalcula desde
+    la tabla de movimientos los totales mensuales afectados. Se puede
+    repetir: no suma nada sobre lo que ya hubiera.
+    """
+    note_id = repair["NoteID"]
+    note = table.get_item(Key={"NoteID": note_id}, ConsistentRead=True).get("Item")
+    if note is not None and note.get("Status", "APPLIED") != "APPLIED":
+        note = None
+    old_note = repair.get("OldNote")
+    record_movements(note_id, old_note, note, update_totals=False)
+
+    for product_id, month in set(movement_totals(old_note)) | set(movement_totals(note)):
+        movements, _ = paginate(
+            movements_table.query,
+            KeyConditionExpression=Key("ProductID").eq(product_id) & Key("MovementKey").begins_with(month),
+            FilterExpression=Attr("NoteType").eq(NOTE_TYPE),
+            ProjectionExpression="Delta",
+        )
+        products_index_table.update_item(
+            Key=kardex_total_key(product_id, month),
+            UpdateExpression="SET Net = :net",
+            ExpressionAttributeValues={":net": sum(item["Delta"] for item in movements)},
+        )
+    journal_table.delete_item(Key={"JournalID": repair["JournalID"]})
+
+
+def note_file_hash(note):
+    """
+    Huella del contenido del archivo xlsx de una nota: cambia si cambian
+    NoteID, Date, las líneas o el formato del libro (NOTE_WORKBOOK_VERSION).
+    """
+    content = {
+        "Version": NOTE_WORKBOOK_VERSION,
+        "NoteID": note.get("NoteID"),
+        "Date": note.get("Date"),
+        "Products": note.get("Products", []),
+    }
+    raw = json.dumps(decimal_to_serializable(content), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def stored_file_hash(object_key):
+    """
+    Huella guardada en los metadatos del objeto de S3 (HEAD), o None si el
+    archivo no existe.
+    """
+    try:
+        response = s3_client().head_object(Bucket=BUCKET_NAME, Key=object_key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return response.get("Metadata", {}).get("content-hash")
+
+
+def note_file_key(note_id):
+    return f"nota_{note_id}.xlsx"
+
+
+def build_note_file(note):
+    """
+    Genera el xlsx de la nota en memoria y devuelve sus bytes.
+    """
+    output = io.BytesIO()
+    try:
+        write_note_workbook(note, output)
+        return output.getvalue()
+    finally:
+        output.close()
+
+
+def accepts_xlsx(event):
+    """
+    True si la petición pide el xlsx en binario (cabecera Accept con el tipo
+    registrado en binaryMediaTypes, que es lo que hace que API Gateway
+    decodifique el cuerpo base64).
+    """
+    headers = event.get("headers") or {}
+    accept = next((value for name, value in headers.items() if name.lower() == "accept"), None) or ""
+    return XLSX_CONTENT_TYPE in accept
+
+
+def ensure_note_file(note, data=None):
+    """
+    Deja en S3 el xlsx de la nota (con decimales ya convertidos) si el que
+    hay no corresponde a su contenido. `data` son los bytes ya generados, si
+    los hay. Devuelve "HIT" si ya estaba al día o "MISS" si se subió.
+    """
+    object_key = note_file_key(note["NoteID"])
+    content_hash = note_file_hash(note)
+
+    # Si el archivo de S3 ya corresponde a este contenido no hay nada que hacer
+    try:
+        if stored_file_hash(object_key) == content_hash:
+            return "HIT"
+    except ClientError:
+        pass
+
+    if data is None:
+        data = build_note_file(note)
+    s3_client().put_object(
+        Bucket=BUCKET_NAME,
+        Key=object_key,
+        Body=data,
+        ContentType=XLSX_CONTENT_TYPE,
+        Metadata={"content-hash": content_hash},
+    )
+    return "MISS"
+
+
+def notify_note_change(event_name, note):
+    """
+    Sustituto local del stream de DynamoDB (NOTE_FILE_PRECOMPUTE=inline):
+    pasa un registro equivalente a la función del stream en un hilo de
+    fondo y devuelve el Future. En los demás modos no hace nada.
+    """
+    if NOTE_FILE_PRECOMPUTE != "inline":
+        return None
+    serializer = TypeSerializer()
+    record = {
+        "eventName": event_name,
+        "dynamodb": {"Keys": {"NoteID": serializer.serialize(note["NoteID"])}},
+    }
+    try:
+        if event_name != "REMOVE":
+            record["dynamodb"]["NewImage"] = {key: serializer.serialize(value) for key, value in note.items()}
+        return file_executor.submit(process_note_file_records, {"Records": [record]})
+    except Exception as e:
+        # Se llama con la nota ya guardada: el xlsx se generará al descargarlo
+        print(json.dumps({"note_file_notify_failed": note["NoteID"], "error": f"{type(e).__name__}: {e}"}))
+        return None
+
+
+def process_note_file_records(event):
+    """
+    Regenera o borra los xlsx de las notas de un lote de registros del
+    stream. Solo se procesa la última imagen de cada nota del lote.
+    """
+    deserializer = TypeDeserializer()
+    latest = {}
+    for record in event.get("Records", []):
+        note_id = deserializer.deserialize(record["dynamodb"]["Keys"]["NoteID"])
+        latest[note_id] = record
+
+    summary = {"generated": 0, "current": 0, "removed": 0}
+    for note_id, record in latest.items():
+        if record["eventName"] == "REMOVE":
+            s3_client().delete_object(Bucket=BUCKET_NAME, Key=note_file_key(note_id))
+            summary["removed"] += 1
+            continue
+        image = record["dynamodb"]["NewImage"]
+        note = decimal_to_serializable({key: deserializer.deserialize(value) for key, value in image.items()})
+        if ensure_note_file(note) == "MISS":
+            summary["generated"] += 1
+        else:
+            summary["current"] += 1
+
+    print(json.dumps({"note_files": summary}))
+    return summary
+
+
+def post_product_adjustments(adjustments, context, idempotency_key=None):
+    """
+    POST {PRODUCTS_API_URL}/adjustments con los ajustes [(ProductID,
+    Quantity)] sumados por producto. products-service los aplica todos o
+    ninguno y, con `idempotency_key`, no aplica dos veces el mismo lote.
+    Devuelve (resultado, detalle) como put_product_quantity; sin tiempo para
+    enviarla el resultado es desconocido, para reintentarla y no darla por
+    rechazada.
+    """
+    deltas = {}
+    for product_id, quantity in adjustments:
+        deltas[product_id] = deltas.get(product_id, 0) + quantity
+    lines = [
+        {"ProductID": product_id, "delta": decimal_to_serializable(delta)}
+        for product_id, delta in deltas.items() if delta
+    ]
+    if not lines:
+        return CALL_APPLIED, None
+
+    timeout = request_timeout(context)
+    if timeout is None:
+        return CALL_UNKNOWN, CALL_NOT_SENT
+    headers = {"X-Stock-Source": "note"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    try:
+        response = http().post(
+            f"{PRODUCTS_API_URL}/adjustments", json={"Adjustments": lines}, headers=headers, timeout=timeout
+        )
+    except http_errors() as e:
+        return CALL_UNKNOWN, f"{type(e).__name__}: {e}"
+    return call_outcome(response.status_code), response.text
+
+
+def claim_note(note_id):
+    """
+    Toma la nota para este worker con un lease de NOTE_LEASE_SECONDS: de
+    PENDING a APPLYING, o una APPLYING cuyo lease venció (el worker que la
+    tenía terminó sin resolverla). Devuelve la nota como estaba antes, o
+    None si otro worker la tiene (SQS puede entregar un mensaje más de una
+    vez), si ya terminó o si ya no existe.
+    """
+    now = int(time.time())
+    try:
+        response = table.update_item(
+            Key={"NoteID": note_id},
+            UpdateExpression="SET #Status = :applying, LeaseUntil = :lease",
+            ConditionExpression=(
+                "#Status = :pending OR (#Status = :applying AND "
+                "(attribute_not_exists(LeaseUntil) OR LeaseUntil < :now))"
+            ),
+            ExpressionAttributeNames={"#Status": "Status"},
+            ExpressionAttributeValues={
+                ":applying": "APPLYING",
+                ":pending": "PENDING",
+                ":now": now,
+                ":lease": now + NOTE_LEASE_SECONDS,
+            },
+            ReturnValues="ALL_OLD",
+        )
+        return response["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return None
+
+
+def assign_batch(note_id, batch_id, previous_batch):
+    """
+    Pasa una nota APPLYING de este worker al lote `batch_id` si sigue en
+    `previous_batch` (None: sin lote). False si otro worker la reasignó.
+    """
+    values = {
+        ":applying": "APPLYING",
+        ":batch": batch_id,
+        ":lease": int(time.time()) + NOTE_LEASE_SECONDS,
+    }
+    if previous_batch is None:
+        condition = "#Status = :applying AND attribute_not_exists(BatchID)"
+    else:
+        condition = "#Status = :applying AND BatchID = :previous"
+        values[":previous"] = previous_batch
+    try:
+        table.update_item(
+            Key={"NoteID": note_id},
+            UpdateExpression="SET BatchID = :batch, LeaseUntil = :lease",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={"#Status": "Status"},
+            ExpressionAttributeValues=values,
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def close_note(note_id, batch_id, error):
+    """
+    Marca la nota del lote `batch_id` como APPLIED o, si hay `error`, como
+    FAILED. Devuelve la nota actualizada, o None si ya no estaba APPLYING en
+    ese lote (otro worker la cerró o la pasó a otro lote).
+    """
+    names = {"#Status": "Status"}
+    values = {":applying": "APPLYING", ":batch": batch_id, ":status": "APPLIED" if error is None else "FAILED"}
+    update = "SET #Status = :status REMOVE LeaseUntil"
+    if error is not None:
+        update = "SET #Status = :status, #Error = :error REMOVE LeaseUntil"
+        names["#Error"] = "Error"
+        values[":error"] = error
+    try:
+        response = table.update_item(
+            Key={"NoteID": note_id},
+            UpdateExpression=update,
+            ConditionExpression="#Status = :applying AND BatchID = :batch",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
+        return response["Attributes"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return None
+
+
+def start_batch(note_adjustments, previous_batches):
+    """
+    Agrupa en un lote nuevo las notas de `note_adjustments` ({NoteID:
+    [(ProductID, Quantity)]}, ya tomadas por este worker) y guarda el lote
+    en la tabla de diarios antes de enviarlo: si no se llega a saber el
+    resultado, se repite con la misma clave. `previous_batches` tiene el
+    BatchID anterior de cada nota. Devuelve el lote, o None si otro worker
+    reasignó todas las notas.
+    """
+    batch_id = str(uuid4())
+    assigned = [
+        note_id for note_id in note_adjustments
+        if assign_batch(note_id, batch_id, previous_batches.get(note_id))
+    ]
+    if not assigned:
+        return None
+    batch = {
+        "JournalID": BATCH_PREFIX + batch_id,
+        "Notes": {
+            note_id: [
+                {"ProductID": product_id, "Quantity": quantity}
+                for product_id, quantity in note_adjustments[note_id]
+            ]
+            for note_id in assigned
+        },
+        "CreatedAt": int(time.time()),
+    }
+    journal_table.put_item(Item=batch)
+    return batch
+
+
+def run_batch(batch, context):
+    """
+    Envía el lote a /products/adjustments con su id como Idempotency-Key
+    (repetirlo no lo aplica dos veces) y resuelve sus notas:
+    - aplicado: pasan a APPLIED y se borra el lote;
+    - rechazo definitivo (4xx): una sola nota pasa a FAILED; con varias, cada
+      una se reintenta en su propio lote para que solo fallen las culpables;
+    - desconocido: siguen APPLYING y el lote queda para repetirlo (reentrega
+      del mensaje o barrido).
+    Devuelve {NoteID: resultado}.
+    """
+    batch_id = batch["JournalID"][len(BATCH_PREFIX):]
+    notes = {
+        note_id: [(line["ProductID"], line["Quantity"]) for line in lines]
+        for note_id, lines in batch["Notes"].items()
+    }
+    outcome, detail = post_product_adjustments(
+        [line for lines in notes.values() for line in lines], context, idempotency_key=batch_id
+    )
+
+    if outcome == CALL_UNKNOWN:
+        print(json.dumps({"note_batch": batch_id, "notes": len(notes), "unknown": detail}))
+        return {note_id: CALL_UNKNOWN for note_id in notes}
+
+    if outcome == CALL_APPLIED:
+        for note_id in notes:
+            note = close_note(note_id, batch_id, None)
+            if note is not None:
+                record_note_movements(note_id, None, note)
+        journal_table.delete_item(Key={"JournalID": batch["JournalID"]})
+        return {note_id: CALL_APPLIED for note_id in notes}
+
+    # No se aplicó nada: el lote se borra antes de reagrupar para que nadie
+    # lo repita con notas que ya están en otro
+    journal_table.delete_item(Key={"JournalID": batch["JournalID"]})
+    if len(notes) == 1:
+        note_id = next(iter(notes))
+        close_note(note_id, batch_id, detail)
+        return {note_id: CALL_REJECTED}
+    results = {}
+    for note_id, lines in notes.items():
+        single = start_batch({note_id: lines}, {note_id: batch_id})
+        if single is not None:
+            results.update(run_batch(single, context))
+    return results
+
+
 def create_outbound_note(event, context):
     body = json.loads(event["body"])
     
@@ -51,6 +1359,9 @@ def create_outbound_note(event, context):
             if not isinstance(body[field], expected_type):
                 errors.append(f"Field '{field}' must be of type {expected_type.__name__}.")
 
+    if isinstance(body.get("Date"), str) and not body["Date"]:
+        errors.append("Field 'Date' must not be empty.")
+
     # Return errors if any validations fail
     if errors:
         return {
@@ -116,30 +1427,51 @@ def create_outbound_note(event, context):
             "body": json.dumps({"errors": product_errors}),
         }
 
-    # Call the products API to update each product
-    for product in products:
-        response = requests.put(
-            f"{PRODUCTS_API_URL}/{product['ProductID']}",
-            json={"Quantity": -product["Quantity"]},
-        )
-        if response.status_code != 200:
-            return {
-                "statusCode": 400,
-                "headers": {
+    note = {"NoteID": note_id, "Date": date, "Products": products, **date_index_attributes(date)}
+
+    if NOTES_INGEST_MODE == "async":
+        # Guardar como PENDING y dejar que el worker aplique el stock
+        note["Status"] = "PENDING"
+        table.put_item(Item=note)
+        notify_note_change("INSERT", note)
+        try:
+            note_queue().send({
+                "NoteID": note_id,
+                "Adjustments": stock_adjustments([], products),
+            })
+        except Exception:
+            table.delete_item(Key={"NoteID": note_id})
+            raise
+        return {
+            "statusCode": 202,
+            "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },
-                "body": json.dumps(
-                    {
-                        "message": f"Failed to update product {product['ProductID']}: {response.text}"
-                    }
-                ),
-            }
+            "body": json.dumps({"message": "outbound note accepted", "NoteID": note_id, "Status": "PENDING"}),
+        }
 
-    # Save the note in DynamoDB
-    note = {"NoteID": note_id, "Date": date, "Products": products}
-    table.put_item(Item=note)
+    # Update each product's stock and save the note in DynamoDB
+    failures = commit_note(
+        stock_adjustments([], products),
+        {"Put": {"TableName": DYNAMO_TABLE, "Item": note}},
+        context,
+    )
+    if failures:
+        product_id, detail = failures[0]
+        return {
+            "statusCode": 400,
+            "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+            "body": json.dumps({"message": f"Failed to update product {product_id}: {detail}"}),
+        }
+
+    record_note_movements(note_id, None, note)
+    notify_note_change("INSERT", note)
 
     return {
         "statusCode": 201,
@@ -169,6 +1501,18 @@ def update_outbound_note(event, context):
         }
     current_note = response["Item"]
 
+    # El stock de una nota asíncrona aún no aplicada (o fallida) no se puede ajustar
+    if current_note.get("Status", "APPLIED") != "APPLIED":
+        return {
+            "statusCode": 409,
+            "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+            "body": json.dumps({"message": f"Note is {current_note['Status']} and cannot be updated."}),
+        }
+
     body = json.loads(event["body"])
 
     if "Products" not in body or not isinstance(body["Products"], list):
@@ -231,35 +1575,18 @@ def update_outbound_note(event, context):
             "body": json.dumps({"errors": product_errors}),
         }
 
-    old_products = {p["ProductID"]: p for p in current_note.get("Products", [])}
-    new_products_dict = {p["ProductID"]: p for p in new_products}
-
-    all_product_ids = set(old_products.keys()).union(new_products_dict.keys())
-
-    for product_id in all_product_ids:
-        old_quantity = old_products.get(product_id, {}).get("Quantity", 0)
-        new_quantity = new_products_dict.get(product_id, {}).get("Quantity", 0)
-        quantity_diff = new_quantity - old_quantity
-
-        if quantity_diff != 0:
-            response = requests.put(
-                f"{PRODUCTS_API_URL}/{product_id}",
-                json={"Quantity": quantity_diff},
-            )
-            if response.status_code != 200:
-                return {
-                    "statusCode": 400,
-                    "headers": {
+    if "Date" in body and (not isinstance(body["Date"], str) or not body["Date"]):
+        return {
+            "statusCode": 400,
+            "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },
-                    "body": json.dumps(
-                        {
-                            "message": f"Failed to update product {product_id}: {response.text}"
-                        }
-                    ),
-                }
+            "body": json.dumps({"message": "Field 'Date' must be a non-empty string."}),
+        }
+
+    adjustments = stock_adjustments(current_note.get("Products", []), new_products)
 
     update_expression = "SET "
     expression_attribute_names = {}
@@ -270,26 +1597,45 @@ def update_outbound_note(event, context):
     expression_attribute_values[":Products"] = new_products
 
     if "Date" in body:
-        if not isinstance(body["Date"], str):
-            return {
-                "statusCode": 400,
-                "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
-        },
-                "body": json.dumps({"message": "Field 'Date' must be a string."}),
-            }
         update_expression += ", #Date = :Date"
         expression_attribute_names["#Date"] = "Date"
         expression_attribute_values[":Date"] = body["Date"]
 
-    table.update_item(
-        Key={"NoteID": note_id},
-        UpdateExpression=update_expression,
-        ExpressionAttributeValues=expression_attribute_values,
-        ExpressionAttributeNames=expression_attribute_names,
+        expression_attribute_names["#DateBucket"] = "DateBucket"
+        date_attributes = date_index_attributes(body["Date"])
+        if date_attributes:
+            update_expression += ", #DateBucket = :DateBucket"
+            expression_attribute_values[":DateBucket"] = date_attributes["DateBucket"]
+        else:
+            update_expression += " REMOVE #DateBucket"
+
+    failures = commit_note(
+        adjustments,
+        {
+            "Update": {
+                "TableName": DYNAMO_TABLE,
+                "Key": {"NoteID": note_id},
+                "UpdateExpression": update_expression,
+                "ExpressionAttributeValues": expression_attribute_values,
+                "ExpressionAttributeNames": expression_attribute_names,
+            }
+        },
+        context,
     )
+    if failures:
+        product_id, detail = failures[0]
+        return {
+            "statusCode": 400,
+            "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+            "body": json.dumps({"message": f"Failed to update product {product_id}: {detail}"}),
+        }
+
+    record_note_movements(note_id, current_note, {"Date": body.get("Date", current_note["Date"]), "Products": new_products})
+    notify_note_change("MODIFY", {**current_note, "Date": body.get("Date", current_note["Date"]), "Products": new_products})
 
     return {
         "statusCode": 200,
@@ -303,13 +1649,48 @@ def update_outbound_note(event, context):
 
 
 def get_all_outbound_notes(event, context):
-    response = table.scan()
-    items = decimal_to_serializable(response["Items"])
+    """
+    GET /outbound-notes?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=N&cursor=...
+
+    Con `from` (y opcionalmente `to`) las notas del rango salen de DateIndex
+    con Query, en orden de fecha; sin rango se recorre la tabla entera. Con
+    `limit` / `cursor` la respuesta es {"Items": [...], "NextCursor": ...}.
+    """
+    query_params = event.get("queryStringParameters") or {}
+    limit, start_key, errors = parse_page_params(query_params)
+    date_from, date_to, date_errors = parse_date_range(query_params)
+    errors.extend(date_errors)
+    # El cursor de DateIndex ({"Bucket", "Key"}) no sirve como ExclusiveStartKey
+    # del Scan ni al revés: se rechaza en vez de fallar en DynamoDB
+    if start_key is not None:
+        if date_from is not None:
+            valid_cursor = valid_date_cursor(start_key)
+        else:
+            valid_cursor = set(start_key) == {"NoteID"} and isinstance(start_key["NoteID"], str)
+        if not valid_cursor:
+            errors.append("Invalid cursor.")
+    if errors:
+        return {"statusCode": 400, "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        }, "body": json.dumps({"errors": errors})}
+
+    if date_from is not None:
+        items, last_key = query_notes_by_date(date_from, date_to, limit=limit, start=start_key)
+    else:
+        items, last_key = paginate(table.scan, limit=limit, start_key=start_key)
+
+    items = [strip_internal(item) for item in decimal_to_serializable(items)]
+    if limit is not None or start_key is not None:
+        body = {"Items": items, "NextCursor": encode_cursor(last_key)}
+    else:
+        body = items
     return {"statusCode": 200, "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
-        },"body": json.dumps(items)}
+        },"body": json.dumps(body)}
 
 
 def get_outbound_note(event, context):
@@ -321,7 +1702,7 @@ def get_outbound_note(event, context):
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },"body": json.dumps({"message": "Note not found"})}
-    note = decimal_to_serializable(response["Item"])
+    note = strip_internal(decimal_to_serializable(response["Item"]))
     return {"statusCode": 200,"headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
@@ -341,32 +1722,75 @@ def delete_outbound_note(event, context):
         }, "body": json.dumps({"message": "Note not found"})}
 
     note = response["Item"]
+    status = note.get("Status", "APPLIED")
 
-    # Llamar al endpoint de productos para revertir las cantidades
-    for product in note["Products"]:
-        response = requests.put(
-            f"{PRODUCTS_API_URL}/{product['ProductID']}",
-            json={"Quantity": -product["Quantity"]},
-        )
-        if response.status_code != 200:
-            return {
-                "statusCode": 400,
-                "headers": {
+    if status in ("PENDING", "APPLYING"):
+        return {
+            "statusCode": 409,
+            "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },
-                "body": json.dumps({"message": f"Failed to revert product {product['ProductID']}: {response.text}"}),
-            }
+            "body": json.dumps({"message": f"Note is {status} and cannot be deleted yet."}),
+        }
+
+    # Revertir las cantidades (una nota FAILED no llegó a aplicarlas) y eliminar la nota de DynamoDB
+    failures = commit_note(
+        stock_adjustments(note["Products"], []) if status == "APPLIED" else [],
+        {"Delete": {"TableName": DYNAMO_TABLE, "Key": {"NoteID": note_id}}},
+        context,
+    )
+    if failures:
+        product_id, detail = failures[0]
+        return {
+            "statusCode": 400,
+            "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+            "body": json.dumps({"message": f"Failed to revert product {product_id}: {detail}"}),
+        }
+    record_note_movements(note_id, note, None)
+    notify_note_change("REMOVE", note)
 
-    # Eliminar la nota de DynamoDB
-    table.delete_item(Key={"NoteID": note_id})
     return {"statusCode": 200, "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },"body": json.dumps({"message": "outbound note deleted"})}
 
+def get_outbound_note_status(event, context):
+    """
+    GET /outbound-notes/{note_id}/status
+    Estado de aplicación de la nota: PENDING, APPLYING, APPLIED o FAILED (con
+    el error). Las notas creadas en modo síncrono están siempre APPLIED.
+    """
+    note_id = event["pathParameters"]["note_id"]
+    response = table.get_item(
+        Key={"NoteID": note_id},
+        ProjectionExpression="NoteID, #Status, #Error",
+        ExpressionAttributeNames={"#Status": "Status", "#Error": "Error"},
+    )
+    if "Item" not in response:
+        return {"statusCode": 404, "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        }, "body": json.dumps({"message": "Note not found"})}
+
+    note = response["Item"]
+    status = {"NoteID": note_id, "Status": note.get("Status", "APPLIED")}
+    if "Error" in note:
+        status["Error"] = note["Error"]
+    return {"statusCode": 200, "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        }, "body": json.dumps(status)}
+
+
 def get_outbound_note_file(event, context):
     # Validate that 'note_id' is provided in pathParameters
     if 'pathParameters' not in event or not event['pathParameters'] or 'note_id' not in event['pathParameters']:
@@ -398,38 +1822,31 @@ def get_outbound_note_file(event, context):
 
     note = decimal_to_serializable(response["Item"])
 
-    # Create an Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Note Details'
-
-    # Write NoteID and Date
-    ws['A1'] = 'NoteID'
-    ws['B1'] = note.get('NoteID')
-    ws['A2'] = 'Date'
-    ws['B2'] = note.get('Date')
-
-    # Leave a blank row
-    ws.append([])
-
-    # Write product headers
-    ws.append(['ProductID', 'Quantity'])
-
-    # Write product data
-    for product in note.get('Products', []):
-        ws.append([product.get('ProductID'), product.get('Quantity')])
-
-    # Save the workbook to a bytes buffer
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    # Upload the Excel file to S3
-    s3 = boto3.client('s3')
-    object_key = f"nota_{note_id}.xlsx"
+    object_key = note_file_key(note_id)
 
+    # Si el cliente acepta el xlsx y es pequeño se devuelve en la propia
+    # respuesta, sin pasar por S3. Si no, normalmente el stream ya generó el
+    # archivo y solo hace falta firmar la URL; si falta o está desactualizado
+    # se sube aquí (reutilizando los bytes si ya se generaron)
     try:
-        s3.upload_fileobj(output, BUCKET_NAME, object_key)
+        data = None
+        if accepts_xlsx(event):
+            data = build_note_file(note)
+            if len(data) <= NOTE_FILE_INLINE_MAX_BYTES:
+                return {
+                    "statusCode": 200,
+                    "headers": {
+                        "Access-Control-Allow-Origin": "*",
+                        "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                        "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE",
+                        "Content-Type": XLSX_CONTENT_TYPE,
+                        "Content-Disposition": f'attachment; filename="{object_key}"',
+                        "X-Cache": "BYPASS"
+                    },
+                    "body": base64.b64encode(data).decode("ascii"),
+                    "isBase64Encoded": True,
+                }
+        cache_status = ensure_note_file(note, data)
     except Exception as e:
         return {
             "statusCode": 500,
@@ -441,10 +1858,8 @@ def get_outbound_note_file(event, context):
             "body": json.dumps({"message": f"Failed to upload file to S3: {str(e)}"}),
         }
 
-    output.close()
-
     try:
-        url = s3.generate_presigned_url(
+        url = s3_client().generate_presigned_url(
             ClientMethod='get_object',
             Params={'Bucket': BUCKET_NAME, 'Key': object_key},
             ExpiresIn=3600 
@@ -465,10 +1880,164 @@ def get_outbound_note_file(event, context):
         "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE",
+            "Content-Type": "application/json",
+            "X-Cache": cache_status
         },
         "body": json.dumps({"download_url": url}),
-        "headers": {
-            "Content-Type": "application/json"
-        }
     }
+
+
+def sweep_outbound_note_journal(event, context):
+    """
+    Tarea programada: revierte los diarios abiertos con más de
+    JOURNAL_SWEEP_AGE_SECONDS (operaciones que fallaron sin poder revertirse
+    o cuya invocación terminó a medias), repite los lotes del worker que
+    quedaron sin resultado y rehace los movimientos que no se escribieron.
+    """
+    cutoff = int(time.time()) - JOURNAL_SWEEP_AGE_SECONDS
+    scan_kwargs = {"FilterExpression": Attr("CreatedAt").lt(cutoff)}
+    journals = []
+    while True:
+        response = journal_table.scan(**scan_kwargs)
+        journals.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    swept = repaired = 0
+    for journal in journals:
+        if request_timeout(context) is None:
+            break
+        swept += 1
+        if journal["JournalID"].startswith(MOVEMENTS_PREFIX):
+            # Movimientos de una nota guardada que no se llegaron a escribir
+            repair_note_movements(journal)
+            repaired += 1
+        elif journal["JournalID"].startswith(BATCH_PREFIX):
+            # Lote del worker cuyo resultado no se llegó a conocer
+            if CALL_UNKNOWN not in run_batch(journal, context).values():
+                repaired += 1
+        elif not compensate_journal(journal, context):
+            repaired += 1
+
+    summary = {"swept": swept, "repaired": repaired, "pending": swept - repaired}
+    print(json.dumps({"journal_sweep": summary}))
+    return {"statusCode": 200, "body": json.dumps(summary)}
+
+
+def process_outbound_note_queue(event, context):
+    """
+    Worker de la cola de notas (trigger SQS). Toma las notas del lote
+    (PENDING, o APPLYING con el lease vencido), suma sus ajustes por
+    producto y los aplica con una sola llamada a /products/adjustments
+    (`run_batch`). Una nota que ya tenía un lote guardado lo repite con su
+    misma clave en vez de enviarse otra vez. Los mensajes de las notas con
+    resultado desconocido se devuelven en batchItemFailures para que SQS los
+    reentregue.
+    """
+    notes = {}
+    message_ids = {}
+    for record in event.get("Records", []):
+        message = json.loads(record["body"])
+        notes.setdefault(message["NoteID"], [tuple(line) for line in message["Adjustments"]])
+        message_ids.setdefault(message["NoteID"], []).append(record["messageId"])
+
+    fresh, previous_batches, pending_batches = {}, {}, {}
+    for note_id, adjustments in notes.items():
+        previous = claim_note(note_id)
+        if previous is None:
+            continue
+        previous_batches[note_id] = previous.get("BatchID")
+        batch = None
+        if previous.get("Status") == "APPLYING" and previous.get("BatchID"):
+            # Sin lote guardado no se llegó a enviar: se trata como nueva
+            batch = journal_table.get_item(
+                Key={"JournalID": BATCH_PREFIX + previous["BatchID"]}, ConsistentRead=True
+            ).get("Item")
+        if batch is None:
+            fresh[note_id] = adjustments
+        else:
+            pending_batches[batch["JournalID"]] = batch
+
+    results = {}
+    for batch in pending_batches.values():
+        results.update(run_batch(batch, context))
+    if fresh:
+        batch = start_batch(fresh, previous_batches)
+        if batch is not None:
+            results.update(run_batch(batch, context))
+
+    outcomes = [results[note_id] for note_id in notes if note_id in results]
+    summary = {
+        "received": len(notes),
+        "applied": outcomes.count(CALL_APPLIED),
+        "failed": outcomes.count(CALL_REJECTED),
+        "unknown": outcomes.count(CALL_UNKNOWN),
+        "skipped": len(notes) - len(outcomes),
+    }
+    print(json.dumps({"note_queue_batch": summary}))
+    return {"batchItemFailures": [
+        {"itemIdentifier": message_id}
+        for note_id in notes if results.get(note_id) == CALL_UNKNOWN
+        for message_id in message_ids[note_id]
+    ]}
+
+
+def reindex_outbound_notes(event, context):
+    """
+    Tarea de mantenimiento: rellena DateBucket en las notas guardadas antes
+    de DateIndex (o con una fecha cambiada a mano) y reescribe los
+    movimientos de las notas aplicadas y los totales mensuales del kardex.
+    """
+    updated = 0
+    totals = {}
+    for note in paginate(table.scan)[0]:
+        if note.get("Status", "APPLIED") == "APPLIED":
+            record_movements(note["NoteID"], None, note, update_totals=False)
+            for key, delta in movement_totals(note).items():
+                totals[key] = totals.get(key, 0) + delta
+        date_attributes = date_index_attributes(note.get("Date") or "")
+        if date_attributes and note.get("DateBucket") != date_attributes["DateBucket"]:
+            table.update_item(
+                Key={"NoteID": note["NoteID"]},
+                UpdateExpression="SET #DateBucket = :DateBucket",
+                ExpressionAttributeNames={"#DateBucket": "DateBucket"},
+                ExpressionAttributeValues={":DateBucket": date_attributes["DateBucket"]},
+            )
+            updated += 1
+
+    # Los meses con total guardado que ya no tienen notas (todas borradas)
+    # vuelven a cero: una Query a la partición KARDEX# de cada producto con
+    # notas o aún en el catálogo
+    product_ids = {product_id for product_id, _ in totals}
+    product_ids.update(item["ProductID"] for item in paginate(products_table.scan, ProjectionExpression="ProductID")[0])
+    for product_id in product_ids:
+        stored, _ = paginate(
+            products_index_table.query,
+            KeyConditionExpression=Key("PK").eq(f"{KARDEX_PREFIX}{product_id}"),
+            FilterExpression=Attr("SK").contains(f"#{NOTE_TYPE}"),
+            ProjectionExpression="SK",
+        )
+        for item in stored:
+            totals.setdefault((product_id, item["SK"].split("#")[0]), 0)
+
+    # Los totales mensuales se recalculan desde cero (sobrescriben, no suman)
+    for (product_id, month), net in totals.items():
+        products_index_table.update_item(
+            Key=kardex_total_key(product_id, month),
+            UpdateExpression="SET Net = :net",
+            ExpressionAttributeValues={":net": net},
+        )
+
+    print(json.dumps({"reindexed_notes": updated}))
+    return {"statusCode": 200, "body": json.dumps({"updated": updated})}
+
+
+def generate_outbound_note_files(event, context):
+    """
+    Trigger del stream de la tabla de notas: mantiene en S3 el xlsx de cada
+    nota creada o modificada (y lo borra al eliminarla), así la descarga
+    solo tiene que firmar la URL.
+    """
+    return process_note_file_records(event)
@@ -0,0 +1,53 @@
+import json
+import threading
+from collections import deque
+from uuid import uuid4
+
+import boto3
+
+
+class SqsNoteQueue:
+    """
+    Cola SQS de notas pendientes de aplicar. Los mensajes los consume el
+    worker a través del trigger SQS de Lambda, que los entrega en lotes.
+    """
+
+    def __init__(self, queue_url, region_name=None):
+        self.queue_url = queue_url
+        self.client = boto3.client("sqs", region_name=region_name)
+
+    def send(self, message):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message))
+
+
+class LocalNoteQueue:
+    """
+    Sustituto en memoria de la cola SQS para ejecutar el servicio en local.
+    `receive_event` devuelve un lote con el mismo formato que el evento que
+    Lambda entrega al worker ({"Records": [{"messageId", "body"}, ...]}).
+    """
+
+    def __init__(self):
+        self._messages = deque()
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self._messages.append({"messageId": str(uuid4()), "body": json.dumps(message)})
+
+    def receive_event(self, max_messages=10):
+        with self._lock:
+            records = [self._messages.popleft() for _ in range(min(max_messages, len(self._messages)))]
+        return {"Records": records}
+
+    def __len__(self):
+        return len(self._messages)
+
+
+def make_note_queue(queue_url, region_name=None):
+    """
+    Cola SQS si hay `queue_url`; si no, la cola en memoria.
+    """
+    if queue_url:
+        return SqsNoteQueue(queue_url, region_name=region_name)
+    return LocalNoteQueue()
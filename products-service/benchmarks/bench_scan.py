@@ -0,0 +1,98 @@
+"""
+Benchmark: scan serie (paginate + table.scan) vs parallel_scan segmentado.
+
+Por defecto usa una tabla simulada en memoria que reproduce el coste de
+DynamoDB por página (1 MB por llamada, latencia fija + tiempo de transferencia
+por partición). Con --table se mide contra una tabla real:
+
+    python benchmarks/bench_scan.py
+    python benchmarks/bench_scan.py --sizes 10000 100000 1000000 --segments 8
+    python benchmarks/bench_scan.py --table Products-Dev --segments 16
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parallel_scan import parallel_scan_all  # noqa: E402
+
+
+ITEM_SIZE_BYTES = 250
+PAGE_SIZE_BYTES = 1024 * 1024
+
+
+class SimulatedTable:
+    """
+    Tabla falsa con la semántica de Scan que usa el handler: Limit,
+    ExclusiveStartKey, Segment/TotalSegments y páginas de 1 MB. Cada página
+    cuesta `page_latency` más el tiempo de leerla a `partition_mbps`.
+    """
+
+    def __init__(self, size, page_latency=0.010, partition_mbps=25.0):
+        self.size = size
+        self.page_latency = page_latency
+        self.page_items = PAGE_SIZE_BYTES // ITEM_SIZE_BYTES
+        self.read_seconds_per_item = ITEM_SIZE_BYTES / (partition_mbps * 1024 * 1024)
+
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=None, Limit=None, **kwargs):
+        first = self.size * Segment // TotalSegments
+        last = self.size * (Segment + 1) // TotalSegments
+        start = ExclusiveStartKey["n"] + 1 if ExclusiveStartKey else first
+        count = min(self.page_items, Limit or self.page_items, last - start)
+        time.sleep(self.page_latency + count * self.read_seconds_per_item)
+        items = [{"ProductID": f"P{n}", "n": n} for n in range(start, start + count)]
+        response = {"Items": items}
+        if start + count < last:
+            response["LastEvaluatedKey"] = {"n": start + count - 1}
+        return response
+
+
+def serial_scan(read):
+    items = []
+    kwargs = {}
+    while True:
+        response = read(**kwargs)
+        items.extend(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def measure(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--table", help="Nombre de una tabla DynamoDB real")
+    args = parser.parse_args()
+
+    if args.table:
+        import boto3
+        from botocore.config import Config
+
+        workers = args.workers or args.segments
+        dynamodb = boto3.resource("dynamodb", config=Config(max_pool_connections=max(10, workers)))
+        targets = [(args.table, dynamodb.Table(args.table))]
+    else:
+        targets = [(f"{size} items", SimulatedTable(size)) for size in args.sizes]
+
+    print(f"{'tabla':>16} {'serie (s)':>10} {'paralelo (s)':>13} {'speedup':>8}")
+    for name, table in targets:
+        serial_time, serial_count = measure(lambda: serial_scan(table.scan))
+        parallel_time, parallel_count = measure(
+            lambda: parallel_scan_all(table.scan, args.segments, max_workers=args.workers)
+        )
+        assert serial_count == parallel_count, (serial_count, parallel_count)
+        print(f"{name:>16} {serial_time:>10.3f} {parallel_time:>13.3f} {serial_time / parallel_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CatalogCache:
+    """
+    Caché en memoria del contenedor Lambda (sobrevive entre invocaciones en
+    caliente).
+
+    - LRU acotado a `max_entries` entradas.
+    - Cada entrada caduca a los `ttl` segundos.
+    - Versionado: `sync_version` vacía la caché cuando cambia el contador de
+      versión del catálogo, que las escrituras incrementan en DynamoDB.
+    - `hits` / `misses` para ajustar tamaño y TTL.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.version_checked_at = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def version_check_due(self, interval):
+        """
+        True si hace más de `interval` segundos que no se consulta la versión.
+        """
+        return self.version_checked_at is None or self.clock() - self.version_checked_at >= interval
+
+    def sync_version(self, version):
+        """
+        Registra la versión actual del catálogo; si cambió, descarta todo.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            self.version_checked_at = self.clock()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "version": self.version,
+        }
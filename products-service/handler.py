@@ -1,14 +1,139 @@
 import json
+import base64
+import heapq
+import time
+import zlib
 import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from decouple import config
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from catalog_cache import CatalogCache
+from parallel_scan import parallel_scan_all
 
 
 AWS_REGION = "us-east-1"
 DYNAMO_TABLE = config("DYNAMO_TABLE")
+INDEX_TABLE = config("INDEX_TABLE")
+# Movimientos de stock por producto, escritos por los servicios de notas
+MOVEMENTS_TABLE = config("MOVEMENTS_TABLE", default="Products-Movements-Dev")
+
+# Lecturas completas de la tabla con scan segmentado en paralelo
+SCAN_SEGMENTS = config("SCAN_SEGMENTS", default=8, cast=int)
+SCAN_WORKERS = config("SCAN_WORKERS", default=8, cast=int)
+
+# Particiones de los GSIs de ordenación (ver SORT_INDEXES). Cambiarlo exige
+# `serverless invoke -f reindexProducts`.
+SORT_SHARDS = config("SORT_SHARDS", default=8, cast=int)
+
+# PutItems condicionales en paralelo del alta masiva
+BULK_WRITE_WORKERS = config("BULK_WRITE_WORKERS", default=8, cast=int)
 
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
+# El pool de conexiones de botocore debe admitir un hilo de scan (o una Query
+# por partición de ordenación, o una escritura del alta masiva) por conexión
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name=AWS_REGION,
+    config=Config(max_pool_connections=max(10, SCAN_WORKERS, SORT_SHARDS, BULK_WRITE_WORKERS)),
+)
 table = dynamodb.Table(DYNAMO_TABLE)
+# Tabla auxiliar de índices (PK/SK): índice invertido de búsqueda, etc.
+index_table = dynamodb.Table(INDEX_TABLE)
+movements_table = dynamodb.Table(MOVEMENTS_TABLE)
+
+# Caché del contenedor: snapshot del catálogo e items individuales
+CACHE_MAX_ENTRIES = config("CACHE_MAX_ENTRIES", default=1024, cast=int)
+# Los cambios solo de stock no incrementan la versión: en otros contenedores
+# el stock en caché puede ir hasta CACHE_TTL_SECONDS por detrás
+CACHE_TTL_SECONDS = config("CACHE_TTL_SECONDS", default=60, cast=float)
+# Cada cuánto se consulta el contador de versión (cota de lecturas obsoletas)
+CACHE_VERSION_CHECK_SECONDS = config("CACHE_VERSION_CHECK_SECONDS", default=2, cast=float)
+CATALOG_VERSION_KEY = {"PK": "META", "SK": "CATALOG_VERSION"}
+CATALOG_CACHE_KEY = ("catalog",)
+# Las estadísticas de caché se agregan y se escriben una vez por intervalo
+CACHE_STATS_INTERVAL_SECONDS = config("CACHE_STATS_INTERVAL_SECONDS", default=60, cast=float)
+
+cache = CatalogCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+# Aciertos/fallos por operación desde la última línea de estadísticas
+cache_reads = {}
+cache_stats_logged_at = time.monotonic()
+
+# Paginación de listados (`limit` + `cursor`)
+MAX_PAGE_LIMIT = 1000
+# Items por lectura cuando se filtra en memoria (`search` corto o con `filter`)
+FILTERED_PAGE_SIZE = 100
+
+# Atributos de clave de la tabla y del GSI por categoría normalizada (ver
+# serverless.yml): forman los cursores de las lecturas filtradas
+TABLE_KEY = ("ProductID",)
+CATEGORY_INDEX = "CategoryIndex"
+CATEGORY_INDEX_KEY = ("CategoryKey", "ProductID")
+
+# GSIs de ordenación: cada producto cae en una de SORT_SHARDS particiones
+# (SortPartition = PRODUCT#n, por hash del ProductID) para no concentrar en
+# una sola las escrituras de todo el catálogo. Cada Query devuelve su
+# partición ordenada y el orden global sale de mezclarlas (heapq.merge).
+SORT_PARTITION_PREFIX = "PRODUCT#"
+SORT_INDEXES = {
+    "Quantity": "QuantityIndex",
+    "LastPrice": "LastPriceIndex",
+    "Name": "NameIndex",
+}
+# Atributo RANGE de cada GSI de ordenación
+SORT_INDEX_FIELDS = {
+    "QuantityIndex": "Quantity",
+    "LastPriceIndex": "LastPrice",
+    "NameIndex": "NameKey",
+}
+# Atributos de clave de tipo N (el resto son S)
+NUMERIC_KEY_FIELDS = ("Quantity", "LastPrice")
+
+sort_executor = ThreadPoolExecutor(max_workers=SORT_SHARDS)
+bulk_write_executor = ThreadPoolExecutor(max_workers=BULK_WRITE_WORKERS)
+
+# Atributos derivados que solo existen para los índices y no se devuelven al cliente
+INTERNAL_ATTRIBUTES = ("CategoryKey", "SortPartition", "NameKey")
+
+# Índice invertido de trigramas para `search`
+SEARCH_FIELDS = ("Name", "Description", "Category")
+TRIGRAM_PREFIX = "TRIGRAM#"
+# Búsquedas más cortas que un trigrama no pueden usar el índice
+MIN_INDEXED_SEARCH = 3
+# Trigramas de la consulta que se buscan como máximo; el resto se verifica en memoria
+MAX_SEARCH_TRIGRAMS = 8
+BATCH_GET_LIMIT = 100
+
+# Máximo de operaciones por TransactWriteItems
+TRANSACT_WRITE_LIMIT = 100
+
+# Diario de los ajustes masivos troceados, en la tabla de índices
+# (PK=ADJUSTMENT_JOURNAL, SK=id). Si la reversión de un lote fallido no se
+# completa, lo termina el barrido pasados ADJUSTMENT_SWEEP_AGE_SECONDS (debe
+# superar el timeout de las funciones).
+ADJUSTMENT_JOURNAL_PK = "ADJUSTMENT_JOURNAL"
+ADJUSTMENT_SWEEP_AGE_SECONDS = config("ADJUSTMENT_SWEEP_AGE_SECONDS", default=900, cast=int)
+
+# Claves de idempotencia de los ajustes de stock (cabecera Idempotency-Key):
+# la marca PK=IDEMPOTENCY#<clave> se escribe en la misma transacción que el
+# ajuste, así que repetir la petición no lo aplica dos veces. Caducan por TTL.
+IDEMPOTENCY_PREFIX = "IDEMPOTENCY#"
+IDEMPOTENCY_TTL_SECONDS = config("IDEMPOTENCY_TTL_SECONDS", default=7 * 24 * 3600, cast=int)
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Kardex: totales mensuales por producto y tipo de movimiento en la tabla de
+# índices (PK=KARDEX#<ProductID>, SK=YYYY-MM#<tipo>). Los servicios de notas
+# escriben los de sus notas; el stream de la tabla de productos, los cambios
+# de stock que no vienen de una nota (PRODUCT), y reindexProducts el saldo
+# anterior a todo el historial (OPENING, en el mes 0000-00).
+KARDEX_PREFIX = "KARDEX#"
+PRODUCT_MOVEMENT = "PRODUCT"
+OPENING_MOVEMENT = "OPENING"
+OPENING_MONTH = "0000-00"
 
 def decimal_to_serializable(obj):
     """
@@ -28,9 +153,698 @@ def decimal_to_serializable(obj):
         # Devuelve el objeto si no necesita conversión
         return obj
 
-def create_product(event, context):
-    body = json.loads(event["body"])
-    
+def deserialize_item(item):
+    """
+    Convierte un item en formato de bajo nivel ({"S": ...}, {"N": ...}), como
+    los que llegan en los errores de DynamoDB, a tipos de Python.
+    """
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+
+def sync_catalog_version():
+    """
+    Compara la versión del catálogo guardada en DynamoDB con la de la caché
+    (como mucho una lectura cada CACHE_VERSION_CHECK_SECONDS) y vacía la
+    caché si otro contenedor modificó productos.
+    """
+    if not cache.version_check_due(CACHE_VERSION_CHECK_SECONDS):
+        return
+    response = index_table.get_item(Key=CATALOG_VERSION_KEY)
+    cache.sync_version(response.get("Item", {}).get("Version", 0))
+
+
+def bump_catalog_version():
+    """
+    Incrementa el contador de versión tras un cambio de forma del catálogo
+    (altas, bajas, nombre, categoría, descripción o precio), invalidando las
+    cachés de todos los contenedores. Los cambios de stock usan
+    `invalidate_stock`: un contador global por movimiento sería una clave
+    caliente y dejaría la caché casi sin aciertos.
+    """
+    response = index_table.update_item(
+        Key=CATALOG_VERSION_KEY,
+        UpdateExpression="ADD Version :one",
+        ExpressionAttributeValues={":one": 1},
+        ReturnValues="UPDATED_NEW",
+    )
+    cache.sync_version(response["Attributes"]["Version"])
+
+
+def invalidate_stock(*product_ids):
+    """
+    Tras un cambio solo de stock descarta en este contenedor el snapshot del
+    catálogo y los items afectados; los demás lo ven al caducar la entrada.
+    """
+    cache.invalidate(CATALOG_CACHE_KEY, *(("product", product_id) for product_id in product_ids))
+
+
+def log_cache_stats(operation, hit):
+    # Una línea JSON por intervalo (no por lectura) con los aciertos y fallos
+    # de cada operación, para filtros de métricas en CloudWatch
+    global cache_stats_logged_at
+    counts = cache_reads.setdefault(operation, {"hits": 0, "misses": 0})
+    counts["hits" if hit else "misses"] += 1
+    now = time.monotonic()
+    if now - cache_stats_logged_at < CACHE_STATS_INTERVAL_SECONDS:
+        return
+    print(json.dumps({"cache_reads": cache_reads, **cache.stats()}, default=decimal_to_serializable))
+    cache_reads.clear()
+    cache_stats_logged_at = now
+
+
+def normalize_category(category):
+    """
+    Clave de partición del índice por categoría: sin espacios y en minúsculas,
+    para que `?filter=` no dependa de cómo se escribió la categoría.
+    """
+    return category.strip().lower()
+
+
+def sort_partition(product_id):
+    """
+    Partición de los GSIs de ordenación de un producto. crc32 y no hash():
+    tiene que ser estable entre procesos.
+    """
+    return f"{SORT_PARTITION_PREFIX}{zlib.crc32(product_id.encode('utf-8')) % SORT_SHARDS}"
+
+
+def index_attributes(product):
+    """
+    Calcula los atributos derivados que alimentan los índices secundarios.
+    """
+    attributes = {"SortPartition": sort_partition(product["ProductID"])}
+    if product.get("Category"):
+        attributes["CategoryKey"] = normalize_category(product["Category"])
+    if product.get("Name"):
+        attributes["NameKey"] = product["Name"].strip().lower()
+    return attributes
+
+
+def order_key(field, reverse=False):
+    """
+    Clave de ordenación tolerante a tipos mezclados: números antes que textos
+    (comparados sin mayúsculas) y los items sin el campo siempre al final.
+    """
+    def key(item):
+        value = item.get(field)
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            rank = 0
+        elif value is None:
+            rank, value = 2, 0
+        else:
+            rank, value = 1, str(value).lower()
+        return (2 - rank, value) if reverse else (rank, value)
+    return key
+
+
+def select_ordered(items, field, reverse=False, count=None):
+    """
+    Devuelve los `count` primeros items según `field`. Con `count` usa
+    selección por heap (O(n log count)) en lugar de ordenar toda la lista.
+    """
+    key = order_key(field, reverse)
+    if count is None:
+        return sorted(items, key=key, reverse=reverse)
+    if reverse:
+        return heapq.nlargest(count, items, key=key)
+    return heapq.nsmallest(count, items, key=key)
+
+
+def query_sorted(index_name, reverse=False, limit=None, start=None):
+    """
+    Lee un GSI de ordenación en orden global: una Query por partición (las
+    primeras páginas en paralelo) y mezcla de los resultados con heapq.merge,
+    leyendo de cada partición solo lo que la mezcla consume.
+
+    Con `limit`, la primera página de cada partición pide solo
+    ceil((limit + 1) / SORT_SHARDS) items (el reparto por hash es uniforme;
+    el +1 es el item que indica si hay página siguiente) en lugar de `limit`,
+    que leería hasta SORT_SHARDS veces la página. Una partición que se
+    agota antes de tiempo se rellena pidiendo lo que aún falta para
+    completar la página.
+
+    `start` y el cursor devuelto son {"Shards": [...]}, con la clave del
+    último item entregado de cada partición (None si aún no se ha entregado
+    ninguno). Devuelve (items, cursor o None).
+    """
+    field = SORT_INDEX_FIELDS[index_name]
+    positions = list(start["Shards"]) if start else [None] * SORT_SHARDS
+    items = []
+
+    def first_page(shard):
+        kwargs = {
+            "IndexName": index_name,
+            "KeyConditionExpression": "SortPartition = :partition",
+            "ExpressionAttributeValues": {":partition": f"{SORT_PARTITION_PREFIX}{shard}"},
+            "ScanIndexForward": not reverse,
+        }
+        if limit is not None:
+            kwargs["Limit"] = -(-(limit + 1) // SORT_SHARDS)
+        if positions[shard]:
+            kwargs["ExclusiveStartKey"] = positions[shard]
+        return kwargs, table.query(**kwargs)
+
+    def shard_items(shard, kwargs, response):
+        while True:
+            for item in response.get("Items", []):
+                yield shard, item
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+            if limit is not None:
+                kwargs["Limit"] = max(limit + 1 - len(items), 1)
+            response = table.query(**kwargs)
+
+    pages = sort_executor.map(first_page, range(SORT_SHARDS))
+    merged = heapq.merge(
+        *(shard_items(shard, *page) for shard, page in enumerate(pages)),
+        key=lambda entry: entry[1][field],
+        reverse=reverse,
+    )
+    for shard, item in merged:
+        # Solo hay cursor si la mezcla tiene al menos un item más
+        if limit is not None and len(items) >= limit:
+            return items, {"Shards": positions}
+        items.append(item)
+        positions[shard] = {"ProductID": item["ProductID"], "SortPartition": item["SortPartition"], field: item[field]}
+    return items, None
+
+
+def valid_key(key, fields):
+    """
+    True si `key` tiene exactamente los atributos de clave `fields` con su
+    tipo de serverless.yml, es decir, si DynamoDB lo acepta como
+    ExclusiveStartKey.
+    """
+    if not isinstance(key, dict) or set(key) != set(fields):
+        return False
+    return all(
+        isinstance(key[field], Decimal if field in NUMERIC_KEY_FIELDS else str)
+        for field in fields
+    )
+
+
+def valid_sorted_cursor(start, index_name):
+    """
+    Comprueba un cursor de `query_sorted`: una posición por partición.
+    """
+    shards = start.get("Shards")
+    if set(start) != {"Shards"} or not isinstance(shards, list) or len(shards) != SORT_SHARDS:
+        return False
+    fields = ("ProductID", "SortPartition", SORT_INDEX_FIELDS[index_name])
+    return all(
+        key is None or (valid_key(key, fields) and key["SortPartition"] == f"{SORT_PARTITION_PREFIX}{shard}")
+        for shard, key in enumerate(shards)
+    )
+
+
+def search_trigrams(product):
+    """
+    Conjunto de trigramas (en minúsculas) de los campos buscables de un producto.
+    Si `search` es subcadena de un campo, todos sus trigramas están en este conjunto.
+    """
+    trigrams = set()
+    for field in SEARCH_FIELDS:
+        text = str(product.get(field) or "").lower()
+        trigrams.update(text[i:i + 3] for i in range(len(text) - 2))
+    return trigrams
+
+
+def update_search_index(product_id, old_product=None, new_product=None, batch=None):
+    """
+    Sincroniza el índice invertido con el cambio de un producto: borra los
+    trigramas que ya no aplican y escribe los nuevos. Con `batch` reutiliza un
+    batch_writer abierto (altas masivas).
+    """
+    old_trigrams = search_trigrams(old_product) if old_product else set()
+    new_trigrams = search_trigrams(new_product) if new_product else set()
+    removed = old_trigrams - new_trigrams
+    added = new_trigrams - old_trigrams
+    if not removed and not added:
+        return
+
+    if batch is None:
+        with index_table.batch_writer() as batch:
+            update_search_index(product_id, old_product, new_product, batch=batch)
+        return
+
+    for trigram in removed:
+        batch.delete_item(Key={"PK": TRIGRAM_PREFIX + trigram, "SK": product_id})
+    for trigram in added:
+        batch.put_item(Item={"PK": TRIGRAM_PREFIX + trigram, "SK": product_id})
+
+
+def search_candidates(search):
+    """
+    ProductIDs que contienen todos los trigramas de `search` (superconjunto
+    de los resultados reales, que se verifican después sobre el item).
+    """
+    query_trigrams = sorted({search[i:i + 3] for i in range(len(search) - 2)})
+    if len(query_trigrams) > MAX_SEARCH_TRIGRAMS:
+        step = len(query_trigrams) / MAX_SEARCH_TRIGRAMS
+        query_trigrams = [query_trigrams[int(i * step)] for i in range(MAX_SEARCH_TRIGRAMS)]
+
+    candidates = None
+    for trigram in query_trigrams:
+        entries, _ = paginate(
+            index_table.query,
+            KeyConditionExpression="PK = :pk",
+            ExpressionAttributeValues={":pk": TRIGRAM_PREFIX + trigram},
+            ProjectionExpression="SK",
+        )
+        ids = {entry["SK"] for entry in entries}
+        candidates = ids if candidates is None else candidates & ids
+        if not candidates:
+            return set()
+    return candidates
+
+
+def batch_get_products(product_ids):
+    """
+    Lee productos por ProductID con BatchGetItem (100 claves por llamada),
+    reintentando las claves no procesadas. Devuelve los items en el orden pedido.
+    """
+    found = {}
+    for start in range(0, len(product_ids), BATCH_GET_LIMIT):
+        request = {DYNAMO_TABLE: {"Keys": [{"ProductID": pid} for pid in product_ids[start:start + BATCH_GET_LIMIT]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(DYNAMO_TABLE, []):
+                found[item["ProductID"]] = item
+            request = response.get("UnprocessedKeys")
+    return [found[pid] for pid in product_ids if pid in found]
+
+
+def search_products(search, limit=None, start_key=None, predicate=None):
+    """
+    Resuelve `search` con el índice invertido: obtiene los ProductIDs candidatos,
+    lee solo esos productos y aplica `predicate` para descartar falsos positivos.
+    Los candidatos se recorren ordenados por ProductID, así que el cursor es
+    simplemente el último ProductID devuelto.
+    """
+    product_ids = sorted(search_candidates(search))
+    if start_key:
+        product_ids = [pid for pid in product_ids if pid > start_key["ProductID"]]
+
+    items = []
+    position = 0
+    while position < len(product_ids) and (limit is None or len(items) < limit):
+        chunk_size = BATCH_GET_LIMIT if limit is None else min(BATCH_GET_LIMIT, limit - len(items))
+        chunk = product_ids[position:position + chunk_size]
+        position += len(chunk)
+        items.extend(item for item in batch_get_products(chunk) if predicate(item))
+
+    last_key = None
+    if limit is not None and position < len(product_ids) and items:
+        last_key = {"ProductID": items[-1]["ProductID"]}
+    return items, last_key
+
+
+def strip_internal(obj):
+    """
+    Quita los atributos internos de índices de un item o lista de items.
+    """
+    if isinstance(obj, list):
+        return [strip_internal(i) for i in obj]
+    return {k: v for k, v in obj.items() if k not in INTERNAL_ATTRIBUTES}
+
+
+def encode_cursor(last_evaluated_key):
+    """
+    Convierte un LastEvaluatedKey de DynamoDB en un token opaco para el cliente.
+    Devuelve None cuando no hay más páginas.
+    """
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(decimal_to_serializable(last_evaluated_key), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Inverso de `encode_cursor`. Lanza ValueError si el token no es válido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        key = json.loads(raw, parse_float=Decimal, parse_int=Decimal)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if not isinstance(key, dict) or not key:
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def parse_page_params(query_params):
+    """
+    Valida los parámetros `limit` y `cursor`. Devuelve (limit, start_key, errors);
+    limit es None cuando el cliente no pide paginación.
+    """
+    errors = []
+    limit = None
+    start_key = None
+
+    raw_limit = query_params.get("limit")
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_LIMIT:
+            errors.append(f"Parameter 'limit' must be an integer between 1 and {MAX_PAGE_LIMIT}.")
+            limit = None
+
+    raw_cursor = query_params.get("cursor")
+    if raw_cursor:
+        try:
+            start_key = decode_cursor(raw_cursor)
+        except ValueError as e:
+            errors.append(str(e))
+
+    return limit, start_key, errors
+
+
+def paginate(read, limit=None, start_key=None, predicate=None, key_fields=TABLE_KEY, **kwargs):
+    """
+    Recorre `table.scan` / `table.query` siguiendo LastEvaluatedKey.
+
+    Con `limit`, cada lectura pide solo los items que faltan para completar la
+    página, así que nunca se lee más de lo necesario y el LastEvaluatedKey
+    devuelto sirve como cursor exacto. Sin `limit`, lee hasta el final (ya no se
+    corta en el primer 1 MB).
+
+    `predicate` filtra en memoria los items leídos. Entonces cada lectura pide
+    al menos FILTERED_PAGE_SIZE items (pedir solo los que faltan acaba en
+    miles de lecturas de 1 item cuando pocos coinciden) y la página se corta
+    en el item `limit`: el cursor es su clave (`key_fields`), no el
+    LastEvaluatedKey de la lectura, para no saltarse los que sobraron.
+    Devuelve (items, last_evaluated_key).
+    """
+    items = []
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+
+    while True:
+        if limit is not None:
+            kwargs["Limit"] = max(limit, FILTERED_PAGE_SIZE) if predicate else limit - len(items)
+        response = read(**kwargs)
+        page = response.get("Items", [])
+        last_key = response.get("LastEvaluatedKey")
+
+        if predicate:
+            for position, item in enumerate(page):
+                if not predicate(item):
+                    continue
+                items.append(item)
+                if limit is not None and len(items) >= limit:
+                    if position == len(page) - 1 and not last_key:
+                        return items, None
+                    return items, {field: item[field] for field in key_fields}
+        else:
+            items.extend(page)
+
+        if not last_key or (limit is not None and len(items) >= limit):
+            return items, last_key
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def quantity_update(product_id, delta, allow_negative=False, note_write=None):
+    """
+    Operación `Update` de TransactWriteItems que suma `delta` al stock.
+    Salvo `allow_negative`, la condición impide que el stock quede negativo.
+    Con `note_write` (ajustes de un servicio de notas) guarda esa marca en
+    NoteWrite para que el stream no lo registre como movimiento PRODUCT.
+    """
+    condition = "attribute_exists(ProductID)"
+    values = {":delta": Decimal(delta)}
+    update = "ADD Quantity :delta"
+    if delta < 0 and not allow_negative:
+        condition += " AND Quantity >= :min"
+        values[":min"] = Decimal(-delta)
+    if note_write is not None:
+        update += " SET NoteWrite = :note_write"
+        values[":note_write"] = note_write
+    return {
+        "Update": {
+            "TableName": DYNAMO_TABLE,
+            "Key": {"ProductID": product_id},
+            "UpdateExpression": update,
+            "ConditionExpression": condition,
+            "ExpressionAttributeValues": values,
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+    }
+
+
+def note_source(event, errors):
+    """
+    True si la petición viene de un servicio de notas (cabecera
+    X-Stock-Source: note): la nota registra su propio movimiento, así que el
+    cambio de stock se marca con NoteWrite. Añade a `errors` un valor
+    inválido.
+    """
+    source = request_header(event, "X-Stock-Source")
+    if source is not None and source != "note":
+        errors.append("Header 'X-Stock-Source' must be 'note'.")
+    return source == "note"
+
+
+def request_header(event, name):
+    """
+    Cabecera de la petición sin distinguir mayúsculas (API Gateway respeta
+    las del cliente). None si no viene.
+    """
+    name = name.lower()
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def idempotency_marker(idempotency_key):
+    """
+    Operación `Put` de TransactWriteItems que registra `idempotency_key`; la
+    transacción se cancela si la clave ya estaba registrada.
+    """
+    now = int(time.time())
+    return {
+        "Put": {
+            "TableName": INDEX_TABLE,
+            "Item": {
+                "PK": IDEMPOTENCY_PREFIX + idempotency_key,
+                "SK": "APPLIED",
+                "CreatedAt": now,
+                "ExpiresAt": now + IDEMPOTENCY_TTL_SECONDS,
+            },
+            "ConditionExpression": "attribute_not_exists(PK)",
+        }
+    }
+
+
+def update_once(update_params, idempotency_key):
+    """
+    Ejecuta el UpdateItem de `update_params` en una transacción con la marca
+    de `idempotency_key`. Devuelve la respuesta con el Quantity resultante,
+    o None si la clave ya se había usado (repetición: no se aplica otra vez).
+    Un fallo de la condición del producto se lanza como el de UpdateItem.
+
+    TransactWriteItems no devuelve valores: el Quantity sale de una lectura
+    consistente posterior, no atómica con la escritura, y puede incluir
+    ajustes concurrentes de otras peticiones. Lo exacto es que el ajuste se
+    aplica una sola vez; el Quantity devuelto es informativo.
+    """
+    update = {k: v for k, v in update_params.items() if k != "ReturnValues"}
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {"Update": {"TableName": DYNAMO_TABLE, **update}},
+            idempotency_marker(idempotency_key),
+        ])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        product_reason, marker_reason = (e.response.get("CancellationReasons") or [{}, {}])[:2]
+        if marker_reason.get("Code") == "ConditionalCheckFailed":
+            return None
+        if product_reason.get("Code") != "ConditionalCheckFailed":
+            raise
+        error = {"Error": {"Code": "ConditionalCheckFailedException", "Message": product_reason.get("Message", "")}}
+        if "Item" in product_reason:
+            error["Item"] = product_reason["Item"]
+        raise ClientError(error, "UpdateItem") from e
+
+    item = table.get_item(
+        Key=update_params["Key"], ConsistentRead=True, ProjectionExpression="Quantity"
+    ).get("Item", {})
+    return {"Attributes": item}
+
+
+def cancellation_failures(product_ids, deltas, error):
+    """
+    Traduce los CancellationReasons de una transacción de ajustes cancelada a
+    [{"ProductID", "reason"}].
+    """
+    failures = []
+    for pid, reason in zip(product_ids, error.response.get("CancellationReasons", [])):
+        code = reason.get("Code", "None")
+        if code == "None":
+            continue
+        if code == "ConditionalCheckFailed" and "Item" not in reason:
+            message = "Product not found"
+        elif code == "ConditionalCheckFailed":
+            current = deserialize_item(reason["Item"]).get("Quantity", 0)
+            message = (
+                f"Resulting 'Quantity' cannot be less than 0. Current Quantity: "
+                f"{decimal_to_serializable(current)}, Adjustment: {deltas[pid]}"
+            )
+        else:
+            message = reason.get("Message") or code
+        failures.append({"ProductID": pid, "reason": message})
+    return failures or [{"ProductID": None, "reason": "Transaction cancelled"}]
+
+
+def journal_update(journal_key, field, index):
+    """
+    Operación `Update` de TransactWriteItems que marca el bloque `index` del
+    diario de ajustes en `Applied` o `Reverted`.
+    """
+    return {
+        "Update": {
+            "TableName": INDEX_TABLE,
+            "Key": journal_key,
+            "UpdateExpression": "SET #field.#chunk = :true",
+            "ConditionExpression": "attribute_exists(PK)",
+            "ExpressionAttributeNames": {"#field": field, "#chunk": str(index)},
+            "ExpressionAttributeValues": {":true": True},
+        }
+    }
+
+
+def compensate_adjustment_journal(journal):
+    """
+    Revierte, del último al primero, los bloques aplicados y aún no revertidos
+    de un diario de ajustes. Cada reversión marca `Reverted` en su propia
+    transacción; si todas se completan se borra el diario. Devuelve True si
+    quedó cerrado.
+    """
+    journal_key = {"PK": journal["PK"], "SK": journal["SK"]}
+    reverted = journal.get("Reverted", {})
+    pending = sorted((int(index) for index in journal.get("Applied", {}) if index not in reverted), reverse=True)
+    # La reversión de un lote de notas tampoco es un movimiento PRODUCT
+    note_write = str(uuid4()) if journal.get("NoteWrite") else None
+    for index in pending:
+        chunk = journal["Chunks"][index]
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                *(quantity_update(pid, -delta, allow_negative=True, note_write=note_write) for pid, delta in chunk.items()),
+                journal_update(journal_key, "Reverted", index),
+            ])
+        except ClientError as e:
+            print(json.dumps({"adjustment_journal": journal["SK"], "revert_failed": index,
+                              "error": e.response["Error"]["Code"]}))
+            return False
+    index_table.delete_item(Key=journal_key)
+    print(json.dumps({"adjustment_journal": journal["SK"], "reverted": len(pending), "closed": True}))
+    return True
+
+
+def apply_quantity_adjustments(deltas, idempotency_key=None, from_note=False):
+    """
+    Aplica `deltas` ({ProductID: delta}) con TransactWriteItems. Si caben en
+    una transacción es atómico; si no, se trocea y, si un bloque falla, se
+    revierten los ya aplicados, de modo que el conjunto es todo o nada.
+
+    Al trocear, cada bloque se anota en un diario dentro de su propia
+    transacción (igual que su reversión) y el último lo borra: si una
+    reversión falla o la invocación termina a medias, el diario queda para
+    `sweep_adjustment_journal`.
+
+    Con `idempotency_key` la marca de la clave se escribe con la transacción
+    (o con el último bloque) y el diario usa la clave como id: mientras está
+    abierto, otra petición con la misma clave lanza el
+    ConditionalCheckFailedException de su PutItem.
+
+    Con `from_note` los productos se marcan con NoteWrite (ver
+    `quantity_update`).
+
+    Devuelve la lista de fallos por producto: [{"ProductID", "reason"}], o
+    None si la clave ya se había usado (no se aplica otra vez).
+    """
+    # El cliente del recurso serializa los valores de Python automáticamente
+    client = dynamodb.meta.client
+    product_ids = [pid for pid, delta in deltas.items() if delta]
+    marker = [idempotency_marker(idempotency_key)] if idempotency_key else []
+    note_write = str(uuid4()) if from_note else None
+
+    if len(product_ids) <= TRANSACT_WRITE_LIMIT - len(marker):
+        try:
+            client.transact_write_items(
+                TransactItems=[*(quantity_update(pid, deltas[pid], note_write=note_write) for pid in product_ids), *marker]
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            # La marca va detrás de los productos
+            reasons = e.response.get("CancellationReasons") or []
+            marker_reason = reasons[len(product_ids)] if marker and len(reasons) > len(product_ids) else {}
+            if marker_reason.get("Code") == "ConditionalCheckFailed":
+                return None
+            return cancellation_failures(product_ids, deltas, e)
+        return []
+
+    # Cada bloque lleva además la operación sobre el diario (y el último, la
+    # marca de la clave)
+    size = TRANSACT_WRITE_LIMIT - 1 - len(marker)
+    chunks = [product_ids[start:start + size] for start in range(0, len(product_ids), size)]
+    journal_key = {"PK": ADJUSTMENT_JOURNAL_PK, "SK": idempotency_key or str(uuid4())}
+    journal = {
+        **journal_key,
+        "Chunks": [{pid: deltas[pid] for pid in chunk} for chunk in chunks],
+        "NoteWrite": from_note,
+        "Applied": {},
+        "Reverted": {},
+        "CreatedAt": int(time.time()),
+    }
+    if not idempotency_key:
+        index_table.put_item(Item=journal)
+    else:
+        index_table.put_item(Item=journal, ConditionExpression="attribute_not_exists(PK)")
+        # La marca solo se escribe junto con el borrado del diario, así que
+        # con el diario tomado no puede aparecer mientras se aplica
+        applied = index_table.get_item(
+            Key={"PK": IDEMPOTENCY_PREFIX + idempotency_key, "SK": "APPLIED"}, ConsistentRead=True
+        )
+        if "Item" in applied:
+            index_table.delete_item(Key=journal_key)
+            return None
+
+    for index, chunk in enumerate(chunks):
+        if index == len(chunks) - 1:
+            journal_ops = [{"Delete": {"TableName": INDEX_TABLE, "Key": journal_key}}, *marker]
+        else:
+            journal_ops = [journal_update(journal_key, "Applied", index)]
+        try:
+            client.transact_write_items(
+                TransactItems=[*(quantity_update(pid, deltas[pid], note_write=note_write) for pid in chunk), *journal_ops]
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            # Compensar los bloques anteriores para no dejar el lote a medias
+            journal["Applied"] = {str(previous): True for previous in range(index)}
+            if not compensate_adjustment_journal(journal):
+                # Parte del lote queda aplicada hasta el barrido
+                invalidate_stock(*deltas)
+            return cancellation_failures(chunk, deltas, e)
+
+    return []
+
+
+def validate_new_product(body, prefix=""):
+    """
+    Valida los campos de un producto nuevo. `prefix` identifica el producto
+    en los mensajes de error del alta masiva.
+    """
     required_fields = {
         "ProductID": str,
         "Name": str,
@@ -39,21 +853,52 @@ def create_product(event, context):
         "LastPrice": (int, float)
     }
 
+    if not isinstance(body, dict):
+        return [f"{prefix}Product must be an object."]
+
     errors = []
 
     for field, field_type in required_fields.items():
         if field not in body:
-            errors.append(f"Field '{field}' is required.")
+            errors.append(f"{prefix}Field '{field}' is required.")
         else:
             value = body[field]
             if not isinstance(value, field_type):
-                errors.append(f"Field '{field}' must be of type {field_type.__name__}.")
+                errors.append(f"{prefix}Field '{field}' must be of type {field_type.__name__}.")
             elif isinstance(value, str) and not value.strip():
-                errors.append(f"Field '{field}' cannot be empty.")
+                errors.append(f"{prefix}Field '{field}' cannot be empty.")
             elif field == "Quantity" and value <= 0:
-                errors.append("Field 'Quantity' must be greater than 0.")
+                errors.append(f"{prefix}Field 'Quantity' must be greater than 0.")
             elif field == "LastPrice" and value <= 0:
-                errors.append("Field 'LastPrice' must be greater than 0.")
+                errors.append(f"{prefix}Field 'LastPrice' must be greater than 0.")
+
+    return errors
+
+
+def new_product_item(body):
+    """
+    Construye el item de DynamoDB de un producto ya validado.
+    """
+    product = {
+        "ProductID": body["ProductID"],
+        "Name": body["Name"],
+        "Description": body.get("Description", ""),  # Optional
+        "Category": body["Category"],
+        "Quantity": body["Quantity"],
+        # DynamoDB no acepta float: se pasa por str para conservar el valor exacto
+        "LastPrice": Decimal(str(body["LastPrice"]))
+    }
+    product.update(index_attributes(product))
+    return product
+
+
+def create_product(event, context):
+    body = json.loads(event["body"])
+
+    if isinstance(body, list):
+        return create_products_bulk(body)
+
+    errors = validate_new_product(body)
 
     if errors:
         return {
@@ -61,22 +906,19 @@ def create_product(event, context):
             "body": json.dumps({"errors": errors}),
         }
 
-    response = table.get_item(Key={"ProductID": body["ProductID"]})
-    if "Item" in response:
+    product = new_product_item(body)
+    # Un único PutItem condicional: sin lectura previa ni carrera entre altas
+    try:
+        table.put_item(Item=product, ConditionExpression="attribute_not_exists(ProductID)")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
         return {
             "statusCode": 409,
             "body": json.dumps({"message": "ProductID already exists."}),
         }
-
-    product = {
-        "ProductID": body["ProductID"],
-        "Name": body["Name"],
-        "Description": body.get("Description", ""),  # Optional
-        "Category": body["Category"],
-        "Quantity": body["Quantity"],
-        "LastPrice": body["LastPrice"]
-    }
-    table.put_item(Item=product)
+    update_search_index(product["ProductID"], new_product=product)
+    bump_catalog_version()
     return {
         "statusCode": 200,
         "headers": {
@@ -86,85 +928,265 @@ def create_product(event, context):
         },
         "body": json.dumps({"message": "Product created successfully!"}),
     }
-    
+
+
+def create_products_bulk(products):
+    """
+    Alta masiva (POST /products con un array). Los duplicados, tanto dentro
+    del propio array como ya existentes en la tabla, se informan por item.
+
+    Cada producto se escribe con un PutItem condicional
+    (attribute_not_exists(ProductID)), hasta BULK_WRITE_WORKERS a la vez: como
+    en el alta individual, un producto creado entre tanto por otra petición
+    no se pisa y se informa como duplicado. BatchWriteItem no admite
+    condiciones.
+    """
+    errors = []
+    for idx, body in enumerate(products):
+        errors.extend(validate_new_product(body, prefix=f"Product at index {idx}: "))
+
+    if not products:
+        errors.append("At least one product is required.")
+
+    if errors:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"errors": errors}),
+        }
+
+    duplicates = []
+    first_index = {}
+    for idx, body in enumerate(products):
+        product_id = body["ProductID"]
+        if product_id in first_index:
+            duplicates.append({"index": idx, "ProductID": product_id, "message": f"Duplicate of product at index {first_index[product_id]}."})
+        else:
+            first_index[product_id] = idx
+
+    def put_new(product):
+        try:
+            table.put_item(Item=product, ConditionExpression="attribute_not_exists(ProductID)")
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    candidates = [new_product_item(products[idx]) for idx in sorted(first_index.values())]
+    futures = [bulk_write_executor.submit(put_new, product) for product in candidates]
+    created = []
+    error = None
+    for product, future in zip(candidates, futures):
+        try:
+            put = future.result()
+        except ClientError as e:
+            # Los ya escritos se indexan igualmente antes de propagar el error
+            error = error or e
+            continue
+        if put:
+            created.append(product)
+        else:
+            duplicates.append({"index": first_index[product["ProductID"]], "ProductID": product["ProductID"], "message": "ProductID already exists."})
+    duplicates.sort(key=lambda d: d["index"])
+
+    if created:
+        with index_table.batch_writer(overwrite_by_pkeys=["PK", "SK"]) as batch:
+            for product in created:
+                update_search_index(product["ProductID"], new_product=product, batch=batch)
+        bump_catalog_version()
+    if error is not None:
+        raise error
+
+    return {
+        "statusCode": 200 if created else 409,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+        "body": json.dumps({
+            "message": f"{len(created)} products created.",
+            "created": [product["ProductID"] for product in created],
+            "duplicates": duplicates,
+        }),
+    }
+
+
 def get_all_products(event, context):
     query_params = event.get("queryStringParameters", {}) or {}
     search = query_params.get("search", "").lower()
     order_by = query_params.get("orderBy", "")
-    category_filter = query_params.get("filter", "").lower()
-    
-    response = table.scan()
-    items = response["Items"]
-
-    if category_filter:
-        items = [item for item in items if item.get("Category", "").lower() == category_filter]
-
-    # Filtrar por el parámetro `search` (si existe)
-    if search:
-        items = [
-            item
-            for item in items
-            if search in item.get("Name", "").lower()
+    category_filter = normalize_category(query_params.get("filter", ""))
+
+    limit, start_key, errors = parse_page_params(query_params)
+    if errors:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"errors": errors}),
+        }
+    paginated = limit is not None or start_key is not None
+
+    def matches(item):
+        # Filtrar por el parámetro `search` (si existe)
+        return (
+            search in item.get("Name", "").lower()
             or search in item.get("Description", "").lower()
             or search in item.get("Category", "").lower()
-        ]
+        )
+
+    cache_status = "BYPASS"
+
+    reverse = order_by.startswith("-")  # Si comienza con "-", es orden descendente
+    order_by_field = order_by.lstrip("-")  # Quita el prefijo "-" para obtener el campo
 
-    if order_by:
-        reverse = order_by.startswith("-")  # Si comienza con "-", es orden descendente
-        order_by_field = order_by.lstrip("-")  # Quita el prefijo "-" para obtener el campo
-        items = sorted(
-            items, key=lambda x: x.get(order_by_field, ""), reverse=reverse
+    # Sin `search` ni `filter`, un orden indexado se lee directamente del GSI:
+    # la página de N items cuesta N lecturas y ya viene ordenada.
+    indexed_order = order_by_field in SORT_INDEXES and not search and not category_filter
+
+    # Cuando se ordena en memoria hay que leer todo el conjunto filtrado;
+    # la página se recorta después con un cursor de desplazamiento.
+    read_limit, read_start_key = (None, None) if order_by else (limit, start_key)
+
+    # Cada camino tiene su forma de cursor; uno de otro camino (p. ej. un
+    # {"Offset": n} sin `orderBy`) no puede llegar a DynamoDB como
+    # ExclusiveStartKey
+    if start_key is not None:
+        if indexed_order:
+            valid_cursor = valid_sorted_cursor(start_key, SORT_INDEXES[order_by_field])
+        elif order_by:
+            offset = start_key.get("Offset")
+            valid_cursor = (
+                set(start_key) == {"Offset"} and isinstance(offset, Decimal)
+                and offset >= 0 and offset == offset.to_integral_value()
+            )
+        elif category_filter and len(search) < MIN_INDEXED_SEARCH:
+            valid_cursor = valid_key(start_key, CATEGORY_INDEX_KEY)
+        else:
+            valid_cursor = valid_key(start_key, TABLE_KEY)
+        if not valid_cursor:
+            return {
+                "statusCode": 400,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                    "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+                },
+                "body": json.dumps({"errors": ["Invalid cursor."]}),
+            }
+
+    if indexed_order:
+        items, last_key = query_sorted(
+            SORT_INDEXES[order_by_field],
+            reverse=reverse,
+            limit=limit,
+            start=start_key,
+        )
+    elif len(search) >= MIN_INDEXED_SEARCH:
+        # Solo se leen los productos que el índice invertido señala como candidatos
+        items, last_key = search_products(
+            search,
+            limit=read_limit,
+            start_key=read_start_key,
+            predicate=lambda item: matches(item) and (
+                not category_filter or normalize_category(item.get("Category", "")) == category_filter
+            ),
+        )
+    elif category_filter:
+        # Solo se leen los items de la categoría pedida
+        items, last_key = paginate(
+            table.query,
+            limit=read_limit,
+            start_key=read_start_key,
+            predicate=matches if search else None,
+            key_fields=CATEGORY_INDEX_KEY,
+            IndexName=CATEGORY_INDEX,
+            KeyConditionExpression="CategoryKey = :category",
+            ExpressionAttributeValues={":category": category_filter},
         )
+    elif read_limit is None and read_start_key is None:
+        # Lectura completa del catálogo: snapshot en caché o todos los segmentos en paralelo
+        sync_catalog_version()
+        items = cache.get(CATALOG_CACHE_KEY)
+        cache_status = "HIT" if items is not None else "MISS"
+        log_cache_stats("get_all_products", items is not None)
+        if items is None:
+            items = parallel_scan_all(table.scan, SCAN_SEGMENTS, max_workers=SCAN_WORKERS)
+            cache.put(CATALOG_CACHE_KEY, items)
+        if search:
+            items = [item for item in items if matches(item)]
+        last_key = None
+    else:
+        items, last_key = paginate(
+            table.scan,
+            limit=read_limit,
+            start_key=read_start_key,
+            predicate=matches if search else None,
+        )
+
+    if order_by and not indexed_order:
+        # Selección top-N por heap en lugar de ordenar toda la lista
+        offset = int((start_key or {}).get("Offset", 0))
+        end = offset + limit if limit is not None else None
+        ordered = select_ordered(items, order_by_field, reverse, count=end)
+        last_key = {"Offset": end} if end is not None and end < len(items) else None
+        items = ordered[offset:]
 
-    items = decimal_to_serializable(items)
+    items = decimal_to_serializable(strip_internal(items))
+
+    if paginated:
+        body = {"Items": items, "NextCursor": encode_cursor(last_key)}
+    else:
+        body = items
 
     return {
         "statusCode": 200,
         "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE",
+            "X-Cache": cache_status
         },
-        "body": json.dumps(items),
+        "body": json.dumps(body),
     }
 
 
 def get_product(event, context):
     product_id = event["pathParameters"]["product_id"]
-    response = table.get_item(Key={"ProductID": product_id})
-    if "Item" not in response:
-        return {
-            "statusCode": 404,
-            "body": json.dumps({"message": "Product not found"}),
-        }
+
+    sync_catalog_version()
+    item = cache.get(("product", product_id))
+    log_cache_stats("get_product", item is not None)
+    cache_status = "HIT" if item is not None else "MISS"
+    if item is None:
+        response = table.get_item(Key={"ProductID": product_id})
+        if "Item" not in response:
+            return {
+                "statusCode": 404,
+                "body": json.dumps({"message": "Product not found"}),
+            }
+        item = response["Item"]
+        cache.put(("product", product_id), item)
+
     return {
         "statusCode": 200,
         "headers": {
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE",
+            "X-Cache": cache_status
         },
-        "body": json.dumps(response["Item"],default=decimal_to_serializable),
+        "body": json.dumps(strip_internal(item),default=decimal_to_serializable),
     }
 
 def update_product(event, context):
     product_id = event["pathParameters"]["product_id"]
     body = json.loads(event["body"])
 
-    response = table.get_item(Key={"ProductID": product_id})
-    if "Item" not in response:
-        return {
-            "statusCode": 404,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
-                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
-            },
-            "body": json.dumps({"message": "Product not found"}),
-        }
-
-    current_product = response["Item"]
-
     valid_fields = {
         "Name": str,
         "Description": str,
@@ -175,6 +1197,9 @@ def update_product(event, context):
 
     errors = []
 
+    if not body:
+        errors.append("At least one field to update is required.")
+
     for key, value in body.items():
         if key not in valid_fields:
             errors.append(f"Field '{key}' is not a valid field to update.")
@@ -185,17 +1210,28 @@ def update_product(event, context):
             errors.append(f"Field '{key}' must be of type {expected_type.__name__}.")
         elif isinstance(value, str) and not value.strip():
             errors.append(f"Field '{key}' cannot be empty.")
-        # elif key == "Quantity" and (current_product.get("Quantity", 0) + value) <= 0:
-        #     errors.append("Resulting 'Quantity' must be greater than 0.")
-        elif key == "Quantity":
-            # Calculate the new quantity and check if it would result in a negative value
-            new_quantity = current_product.get("Quantity", 0) + value
-            if new_quantity < 0:
-                errors.append(f"Resulting 'Quantity' cannot be less than 0. Current Quantity: {current_product.get('Quantity', 0)}, Adjustment: {value}")
-        
         elif key == "LastPrice" and value <= 0:
             errors.append("Field 'LastPrice' must be greater than 0.")
 
+    # Solo los ajustes de Quantity son repetibles con Idempotency-Key
+    idempotency_key = request_header(event, "Idempotency-Key")
+    if idempotency_key is not None:
+        if set(body) != {"Quantity"}:
+            errors.append("Header 'Idempotency-Key' is only supported for Quantity-only updates.")
+        elif not 1 <= len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+            errors.append(f"Header 'Idempotency-Key' must have between 1 and {MAX_IDEMPOTENCY_KEY_LENGTH} characters.")
+
+    # La reversión de un ajuste ya aplicado (diario de los servicios de notas)
+    # no comprueba el stock mínimo, igual que la del modo "direct"
+    compensation = request_header(event, "X-Stock-Compensation")
+    if compensation is not None:
+        if compensation != "true":
+            errors.append("Header 'X-Stock-Compensation' must be 'true'.")
+        elif idempotency_key is None:
+            errors.append("Header 'X-Stock-Compensation' requires an 'Idempotency-Key' header.")
+    from_note = note_source(event, errors)
+    if from_note and set(body) != {"Quantity"}:
+        errors.append("Header 'X-Stock-Source' is only supported for Quantity-only updates.")
 
     if errors:
         return {
@@ -208,36 +1244,119 @@ def update_product(event, context):
             "body": json.dumps({"errors": errors}),
         }
 
-    # Build update expression
-    update_expression = "SET "
+    # Build update expression. Quantity es un ajuste relativo: se aplica con
+    # ADD en el propio UpdateItem, sin leer antes el producto.
+    set_clauses = []
     expression_attribute_values = {}
     expression_attribute_names = {}
+    condition_expression = "attribute_exists(ProductID)"
 
     for key, value in body.items():
         if key == "Name":
             alias = "#name"
             expression_attribute_names[alias] = key
-            update_expression += f"{alias} = :{key}, "
+            set_clauses.append(f"{alias} = :{key}")
             expression_attribute_values[f":{key}"] = value
+            set_clauses.append("NameKey = :NameKey")
+            expression_attribute_values[":NameKey"] = value.strip().lower()
         elif key == "Quantity":
-            new_quantity = current_product.get("Quantity", 0) + value
-            update_expression += f"{key} = :{key}, "
-            expression_attribute_values[f":{key}"] = Decimal(new_quantity)
+            expression_attribute_values[f":{key}"] = Decimal(value)
+            if value < 0 and compensation is None:
+                # El stock resultante no puede quedar negativo
+                condition_expression += " AND Quantity >= :MinQuantity"
+                expression_attribute_values[":MinQuantity"] = Decimal(-value)
+        elif key == "Category":
+            set_clauses.append(f"{key} = :{key}")
+            expression_attribute_values[f":{key}"] = value
+            set_clauses.append("CategoryKey = :CategoryKey")
+            expression_attribute_values[":CategoryKey"] = normalize_category(value)
         else:
-            update_expression += f"{key} = :{key}, "
+            set_clauses.append(f"{key} = :{key}")
             expression_attribute_values[f":{key}"] = Decimal(value) if isinstance(value, (int, float)) else value
 
-    update_expression = update_expression.rstrip(", ")
+    if from_note:
+        set_clauses.append("NoteWrite = :NoteWrite")
+        expression_attribute_values[":NoteWrite"] = str(uuid4())
+
+    update_expression = ""
+    if set_clauses:
+        update_expression = "SET " + ", ".join(set_clauses)
+    if "Quantity" in body:
+        update_expression += " ADD Quantity :Quantity"
+
+    # Si cambian campos buscables hace falta el item anterior para actualizar
+    # el índice invertido; si no, basta con los valores nuevos.
+    reindex_search = any(field in body for field in SEARCH_FIELDS)
 
     update_params = {
         "Key": {"ProductID": product_id},
-        "UpdateExpression": update_expression,
+        "UpdateExpression": update_expression.strip(),
+        "ConditionExpression": condition_expression,
         "ExpressionAttributeValues": expression_attribute_values,
+        "ReturnValues": "ALL_OLD" if reindex_search else "UPDATED_NEW",
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
     }
     if expression_attribute_names:
         update_params["ExpressionAttributeNames"] = expression_attribute_names
 
-    table.update_item(**update_params)
+    try:
+        if idempotency_key is None:
+            response = table.update_item(**update_params)
+        else:
+            response = update_once(update_params, idempotency_key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        if "Item" not in e.response:
+            return {
+                "statusCode": 404,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                    "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+                },
+                "body": json.dumps({"message": "Product not found"}),
+            }
+        current_quantity = deserialize_item(e.response["Item"]).get("Quantity", 0)
+        return {
+            "statusCode": 400,
+            "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps(
+                {"errors": [f"Resulting 'Quantity' cannot be less than 0. Current Quantity: {decimal_to_serializable(current_quantity)}, Adjustment: {body['Quantity']}"]}
+            ),
+        }
+
+    if response is None:
+        # Repetición de un ajuste ya aplicado con la misma Idempotency-Key
+        return {
+            "statusCode": 200,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"message": "Product updated successfully!", "Replayed": True}),
+        }
+
+    attributes = response.get("Attributes", {})
+    if reindex_search:
+        old_product = attributes
+        update_search_index(product_id, old_product, {**old_product, **body})
+        new_quantity = old_product.get("Quantity", 0) + body.get("Quantity", 0)
+    else:
+        new_quantity = attributes.get("Quantity")
+    if any(key != "Quantity" for key in body):
+        bump_catalog_version()
+    else:
+        invalidate_stock(product_id)
+
+    result = {"message": "Product updated successfully!"}
+    if "Quantity" in body:
+        result["Quantity"] = decimal_to_serializable(new_quantity)
 
     return {
         "statusCode": 200,
@@ -246,12 +1365,15 @@ def update_product(event, context):
             "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
         },
-        "body": json.dumps({"message": "Product updated successfully!"}),
+        "body": json.dumps(result),
     }
 
 def delete_product(event, context):
     product_id = event["pathParameters"]["product_id"]
-    table.delete_item(Key={"ProductID": product_id})
+    response = table.delete_item(Key={"ProductID": product_id}, ReturnValues="ALL_OLD")
+    if "Attributes" in response:
+        update_search_index(product_id, old_product=response["Attributes"])
+        bump_catalog_version()
     return {
         "statusCode": 200,
         "headers": {
@@ -261,3 +1383,335 @@ def delete_product(event, context):
         },
         "body": json.dumps({"message": "Product deleted successfully!"}),
     }
+
+
+def adjust_products(event, context):
+    """
+    POST /products/adjustments
+    Body: {"Adjustments": [{"ProductID": "...", "delta": 5}, ...]}
+
+    Aplica todos los ajustes de stock o ninguno. Las líneas repetidas de un
+    mismo producto se suman antes de escribir. Con la cabecera
+    Idempotency-Key, repetir el lote devuelve 200 sin aplicarlo otra vez y,
+    mientras un lote troceado con esa clave sigue abierto, 409.
+    """
+    body = json.loads(event["body"])
+    adjustments = body.get("Adjustments") if isinstance(body, dict) else None
+    idempotency_key = request_header(event, "Idempotency-Key")
+
+    if not isinstance(adjustments, list) or not adjustments:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"message": "Field 'Adjustments' is required and must be a non-empty list."}),
+        }
+
+    errors = []
+    deltas = {}
+    lines = {}
+    for idx, line in enumerate(adjustments):
+        if not isinstance(line, dict):
+            errors.append(f"Adjustment at index {idx} must be an object.")
+            continue
+        product_id = line.get("ProductID")
+        delta = line.get("delta")
+        if not isinstance(product_id, str) or not product_id.strip():
+            errors.append(f"Field 'ProductID' in adjustment at index {idx} must be a non-empty str.")
+        elif not isinstance(delta, int) or isinstance(delta, bool):
+            errors.append(f"Field 'delta' in adjustment at index {idx} must be of type int.")
+        else:
+            deltas[product_id] = deltas.get(product_id, 0) + delta
+            lines.setdefault(product_id, []).append(idx)
+    if idempotency_key is not None and not 1 <= len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        errors.append(f"Header 'Idempotency-Key' must have between 1 and {MAX_IDEMPOTENCY_KEY_LENGTH} characters.")
+    from_note = note_source(event, errors)
+
+    if errors:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"errors": errors}),
+        }
+
+    try:
+        failures = apply_quantity_adjustments(deltas, idempotency_key, from_note)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # Diario abierto con la misma clave: otra petición la está aplicando
+        # (o revirtiendo); el cliente debe reintentar más tarde
+        return {
+            "statusCode": 409,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"message": "Adjustments with this Idempotency-Key are in progress."}),
+        }
+
+    if failures is None:
+        # Repetición de un lote ya aplicado con la misma Idempotency-Key
+        return {
+            "statusCode": 200,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"message": "Adjustments applied successfully!", "Replayed": True}),
+        }
+    if failures:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({
+                "message": "No adjustments were applied.",
+                "failures": [
+                    {**failure, "lines": lines.get(failure["ProductID"], [])}
+                    for failure in failures
+                ],
+            }),
+        }
+
+    invalidate_stock(*deltas)
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+        "body": json.dumps({
+            "message": "Adjustments applied successfully!",
+            "products": len([delta for delta in deltas.values() if delta]),
+        }),
+    }
+
+
+def get_product_movements(event, context):
+    """
+    GET /products/{product_id}/movements?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=N&cursor=...
+
+    Notas de entrada y salida y cambios de stock hechos fuera de las notas
+    (NoteType PRODUCT) del producto, en orden de fecha. Solo se lee la
+    partición del producto en la tabla de movimientos.
+    """
+    product_id = event["pathParameters"]["product_id"]
+    query_params = event.get("queryStringParameters", {}) or {}
+
+    limit, start_key, errors = parse_page_params(query_params)
+    date_from = query_params.get("from")
+    date_to = query_params.get("to")
+    if date_from is not None and date_to is not None and date_to < date_from:
+        errors.append("Parameter 'to' must not be earlier than 'from'.")
+    if errors:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+                "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+            },
+            "body": json.dumps({"errors": errors}),
+        }
+
+    # MovementKey = "{Date}#{NoteType}#{NoteID}": el rango de fechas es un rango de la clave
+    key_condition = "ProductID = :product_id"
+    values = {":product_id": product_id}
+    if date_from is not None and date_to is not None:
+        key_condition += " AND MovementKey BETWEEN :from AND :to"
+        values.update({":from": date_from, ":to": date_to + "\uffff"})
+    elif date_from is not None:
+        key_condition += " AND MovementKey >= :from"
+        values[":from"] = date_from
+    elif date_to is not None:
+        key_condition += " AND MovementKey <= :to"
+        values[":to"] = date_to + "\uffff"
+
+    items, last_key = paginate(
+        movements_table.query,
+        limit=limit,
+        start_key=start_key,
+        KeyConditionExpression=key_condition,
+        ExpressionAttributeValues=values,
+    )
+    items = [{k: v for k, v in item.items() if k != "MovementKey"} for item in items]
+    if limit is not None or start_key is not None:
+        body = {"Items": items, "NextCursor": encode_cursor(last_key)}
+    else:
+        body = items
+
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token",
+            "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PUT,DELETE"
+        },
+        "body": json.dumps(body, default=decimal_to_serializable),
+    }
+
+
+def sweep_adjustment_journal(event, context):
+    """
+    Tarea programada: revierte los ajustes masivos con un diario abierto de
+    más de ADJUSTMENT_SWEEP_AGE_SECONDS (reversiones que fallaron o
+    invocaciones que terminaron a medias).
+    """
+    cutoff = int(time.time()) - ADJUSTMENT_SWEEP_AGE_SECONDS
+    journals, _ = paginate(
+        index_table.query,
+        KeyConditionExpression="PK = :pk",
+        FilterExpression="CreatedAt < :cutoff",
+        ExpressionAttributeValues={":pk": ADJUSTMENT_JOURNAL_PK, ":cutoff": cutoff},
+    )
+    repaired = sum(1 for journal in journals if compensate_adjustment_journal(journal))
+    summary = {"swept": len(journals), "repaired": repaired, "pending": len(journals) - repaired}
+    print(json.dumps({"adjustment_journal_sweep": summary}))
+    return {"statusCode": 200, "body": json.dumps(summary)}
+
+
+def kardex_total_update(product_id, month, movement_type, delta):
+    """
+    Operación `Update` de TransactWriteItems que suma `delta` al total
+    mensual del kardex del producto.
+    """
+    return {
+        "Update": {
+            "TableName": INDEX_TABLE,
+            "Key": {"PK": f"{KARDEX_PREFIX}{product_id}", "SK": f"{month}#{movement_type}"},
+            "UpdateExpression": "ADD Net :delta",
+            "ExpressionAttributeValues": {":delta": delta},
+        }
+    }
+
+
+def record_stock_movements(event, context):
+    """
+    Stream de la tabla de productos (NEW_AND_OLD_IMAGES): registra como
+    movimiento PRODUCT cada cambio de Quantity que no hizo una nota (alta,
+    PUT, ajustes, baja), fechado cuando se escribió, y lo suma al total
+    mensual del kardex. Los cambios de las notas (NoteWrite distinto del de
+    la imagen anterior) ya tienen su movimiento.
+
+    La clave del movimiento lleva el eventID del registro y se escribe con
+    attribute_not_exists en la misma transacción que el total, así que
+    reprocesar un lote del stream no cuenta nada dos veces.
+    """
+    deserializer = TypeDeserializer()
+    recorded = 0
+    for record in event["Records"]:
+        images = record["dynamodb"]
+        old = {k: deserializer.deserialize(v) for k, v in images.get("OldImage", {}).items()}
+        new = {k: deserializer.deserialize(v) for k, v in images.get("NewImage", {}).items()}
+        if record["eventName"] == "MODIFY" and old.get("NoteWrite") != new.get("NoteWrite"):
+            continue
+        delta = new.get("Quantity", 0) - old.get("Quantity", 0)
+        if not delta:
+            continue
+
+        product_id = (new or old)["ProductID"]
+        written = datetime.fromtimestamp(int(images["ApproximateCreationDateTime"]), timezone.utc)
+        date = written.strftime("%Y-%m-%dT%H:%M:%S")
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {"Put": {
+                    "TableName": MOVEMENTS_TABLE,
+                    "Item": {
+                        "ProductID": product_id,
+                        "MovementKey": f"{date}#{PRODUCT_MOVEMENT}#{record['eventID']}",
+                        "Date": date,
+                        "NoteType": PRODUCT_MOVEMENT,
+                        "Quantity": abs(delta),
+                        "Delta": delta,
+                    },
+                    "ConditionExpression": "attribute_not_exists(MovementKey)",
+                }},
+                kardex_total_update(product_id, date[:7], PRODUCT_MOVEMENT, delta),
+            ])
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            reasons = e.response.get("CancellationReasons") or [{}]
+            if reasons[0].get("Code") != "ConditionalCheckFailed":
+                raise
+            # Registro ya procesado en una entrega anterior del lote
+            continue
+        recorded += 1
+    print(json.dumps({"stock_movements": recorded, "records": len(event["Records"])}))
+
+
+def backfill_kardex_opening(product):
+    """
+    Escribe el saldo OPENING del kardex de un producto que aún no lo tiene:
+    su Quantity actual menos todos los totales ya registrados, es decir, el
+    stock que tenía antes del historial (stock inicial y cambios hechos
+    antes de que existiera el stream). Solo la primera vez: un OPENING ya
+    escrito no se recalcula, porque con escrituras en curso el cálculo puede
+    contar de más o de menos lo que aún no llegó a los totales.
+    """
+    product_id = product["ProductID"]
+    totals, _ = paginate(
+        index_table.query,
+        KeyConditionExpression="PK = :pk",
+        ExpressionAttributeValues={":pk": f"{KARDEX_PREFIX}{product_id}"},
+        ProjectionExpression="SK, Net",
+    )
+    if any(total["SK"] == f"{OPENING_MONTH}#{OPENING_MOVEMENT}" for total in totals):
+        return False
+    opening = product.get("Quantity", 0) - sum(total["Net"] for total in totals)
+    try:
+        index_table.put_item(
+            Item={"PK": f"{KARDEX_PREFIX}{product_id}", "SK": f"{OPENING_MONTH}#{OPENING_MOVEMENT}", "Net": opening},
+            ConditionExpression="attribute_not_exists(PK)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def reindex_products(event, context):
+    """
+    Recalcula los atributos derivados de los índices para todos los productos
+    y reescribe sus entradas del índice invertido de búsqueda. También
+    escribe el saldo OPENING del kardex de los productos que no lo tienen.
+    Se invoca manualmente tras desplegar un índice nuevo:
+    `serverless invoke -f reindexProducts`.
+    """
+    items = parallel_scan_all(table.scan, SCAN_SEGMENTS, max_workers=SCAN_WORKERS)
+    updated = 0
+    with index_table.batch_writer(overwrite_by_pkeys=["PK", "SK"]) as batch:
+        for item in items:
+            for trigram in search_trigrams(item):
+                batch.put_item(Item={"PK": TRIGRAM_PREFIX + trigram, "SK": item["ProductID"]})
+
+    for item in items:
+        attributes = index_attributes(item)
+        stale = {k: v for k, v in attributes.items() if item.get(k) != v}
+        if not stale:
+            continue
+        table.update_item(
+            Key={"ProductID": item["ProductID"]},
+            UpdateExpression="SET " + ", ".join(f"{k} = :{k}" for k in stale),
+            ExpressionAttributeValues={f":{k}": v for k, v in stale.items()},
+        )
+        updated += 1
+    if updated:
+        bump_catalog_version()
+    openings = sum(1 for item in items if backfill_kardex_opening(item))
+    return {"scanned": len(items), "updated": updated, "kardex_openings": openings}
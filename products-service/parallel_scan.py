@@ -0,0 +1,79 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Marca de fin de segmento en la cola de resultados
+_SEGMENT_DONE = object()
+
+
+def parallel_scan(read, total_segments, max_workers=None, limit=None, **kwargs):
+    """
+    Scan segmentado de DynamoDB (`Segment`/`TotalSegments`) repartido en un
+    pool de hilos acotado.
+
+    `read` es `table.scan` (o cualquier función con la misma firma). Cada
+    segmento se recorre siguiendo su propio LastEvaluatedKey y sus páginas se
+    entregan en cuanto llegan, así que los items se consumen como un stream
+    (sin orden global). Con `limit` se detiene la lectura de todos los
+    segmentos en cuanto se han entregado `limit` items.
+    """
+    max_workers = min(max_workers or total_segments, total_segments)
+    results = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+
+    def offer(entry):
+        # put con timeout para que un consumidor que ya paró no bloquee el hilo
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        try:
+            scan_kwargs = dict(kwargs, Segment=segment, TotalSegments=total_segments)
+            while not stop.is_set():
+                response = read(**scan_kwargs)
+                if not offer(response.get("Items", [])):
+                    return
+                last_key = response.get("LastEvaluatedKey")
+                if not last_key:
+                    break
+                scan_kwargs["ExclusiveStartKey"] = last_key
+        except Exception as e:
+            offer(e)
+        finally:
+            offer(_SEGMENT_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for segment in range(total_segments):
+            executor.submit(scan_segment, segment)
+
+        pending = total_segments
+        delivered = 0
+        while pending:
+            entry = results.get()
+            if entry is _SEGMENT_DONE:
+                pending -= 1
+                continue
+            if isinstance(entry, Exception):
+                raise entry
+            for item in entry:
+                yield item
+                delivered += 1
+                if limit is not None and delivered >= limit:
+                    return
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parallel_scan_all(read, total_segments, max_workers=None, limit=None, **kwargs):
+    """
+    Igual que `parallel_scan` pero devuelve la lista completa de items.
+    """
+    return list(parallel_scan(read, total_segments, max_workers=max_workers, limit=limit, **kwargs))
@@ -0,0 +1,86 @@
+"""
+Fixtures comunes: DynamoDB con moto, con las tablas de serverless.yml.
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import importlib
+import os
+import sys
+
+# boto3 y moto antes que el directorio del servicio, que vendoriza su boto3
+import boto3
+import pytest
+from moto import mock_aws
+
+SERVICE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ENV = {
+    "AWS_ACCESS_KEY_ID": "test",
+    "AWS_SECRET_ACCESS_KEY": "test",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "DYNAMO_TABLE": "Test-Products",
+    "INDEX_TABLE": "Test-Products-Index",
+    "MOVEMENTS_TABLE": "Test-Products-Movements",
+    "CACHE_VERSION_CHECK_SECONDS": "0",
+}
+
+SORT_INDEXES = {"QuantityIndex": ("Quantity", "N"), "LastPriceIndex": ("LastPrice", "N"), "NameIndex": ("NameKey", "S")}
+
+
+def key_schema(*names):
+    return [{"AttributeName": name, "KeyType": kind} for name, kind in zip(names, ("HASH", "RANGE"))]
+
+
+def create_tables():
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    indexes = [{"IndexName": "CategoryIndex", "KeySchema": key_schema("CategoryKey", "ProductID"),
+                "Projection": {"ProjectionType": "ALL"}}]
+    attributes = [{"AttributeName": name, "AttributeType": "S"} for name in ("ProductID", "CategoryKey", "SortPartition")]
+    for index_name, (field, kind) in SORT_INDEXES.items():
+        indexes.append({"IndexName": index_name, "KeySchema": key_schema("SortPartition", field),
+                        "Projection": {"ProjectionType": "ALL"}})
+        attributes.append({"AttributeName": field, "AttributeType": kind})
+    client.create_table(
+        TableName=ENV["DYNAMO_TABLE"],
+        KeySchema=key_schema("ProductID"),
+        AttributeDefinitions=attributes,
+        GlobalSecondaryIndexes=indexes,
+        BillingMode="PAY_PER_REQUEST",
+    )
+    for table_name, key in ((ENV["INDEX_TABLE"], ("PK", "SK")), (ENV["MOVEMENTS_TABLE"], ("ProductID", "MovementKey"))):
+        client.create_table(
+            TableName=table_name,
+            KeySchema=key_schema(*key),
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name in key],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+@pytest.fixture
+def load_handler(monkeypatch):
+    """
+    Importa handler.py con ENV más las variables dadas, sobre tablas vacías.
+    """
+    for name, value in ENV.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.syspath_prepend(SERVICE_DIR)
+    mock = mock_aws()
+    mock.start()
+    create_tables()
+
+    def load(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        for module in ("handler", "catalog_cache", "parallel_scan"):
+            sys.modules.pop(module, None)
+        return importlib.import_module("handler")
+
+    yield load
+    sys.modules.pop("handler", None)
+    mock.stop()
+
+
+@pytest.fixture
+def handler(load_handler):
+    return load_handler()
@@ -0,0 +1,59 @@
+"""
+Caché del catálogo: la versión solo cambia con la forma del catálogo y las
+estadísticas se escriben agregadas.
+"""
+import json
+
+
+def catalog_version(handler):
+    item = handler.index_table.get_item(Key=handler.CATALOG_VERSION_KEY).get("Item", {})
+    return item.get("Version", 0)
+
+
+def get_product(handler, product_id):
+    response = handler.get_product({"pathParameters": {"product_id": product_id}}, None)
+    return response["headers"]["X-Cache"], json.loads(response["body"])
+
+
+def put_product(handler, product_id, body):
+    event = {"pathParameters": {"product_id": product_id}, "body": json.dumps(body), "headers": {}}
+    assert handler.update_product(event, None)["statusCode"] == 200
+
+
+def test_stock_changes_do_not_bump_the_version(handler):
+    body = [{"ProductID": "P1", "Name": "Hammer", "Category": "Tools", "Quantity": 10, "LastPrice": 5}]
+    assert handler.create_product({"body": json.dumps(body)}, None)["statusCode"] == 200
+    created = catalog_version(handler)
+    assert created == 1
+
+    assert get_product(handler, "P1")[0] == "MISS"
+    assert get_product(handler, "P1")[0] == "HIT"
+
+    put_product(handler, "P1", {"Quantity": -3})
+    adjustments = {"Adjustments": [{"ProductID": "P1", "delta": 2}]}
+    assert handler.adjust_products({"body": json.dumps(adjustments), "headers": {}}, None)["statusCode"] == 200
+
+    assert catalog_version(handler) == created
+    # La caché de este contenedor no devuelve el stock anterior
+    status, product = get_product(handler, "P1")
+    assert (status, product["Quantity"]) == ("MISS", 9)
+
+    put_product(handler, "P1", {"Name": "Claw hammer"})
+    assert catalog_version(handler) == created + 1
+
+
+def test_cache_stats_are_logged_once_per_interval(load_handler, capsys):
+    handler = load_handler(CACHE_STATS_INTERVAL_SECONDS="3600")
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 1})
+
+    for _ in range(5):
+        get_product(handler, "P1")
+    assert capsys.readouterr().out == ""
+
+    handler.CACHE_STATS_INTERVAL_SECONDS = 0
+    get_product(handler, "P1")
+    lines = capsys.readouterr().out.splitlines()
+
+    assert len(lines) == 1
+    assert json.loads(lines[0])["cache_reads"] == {"get_product": {"hits": 5, "misses": 1}}
+    assert handler.cache_reads == {}
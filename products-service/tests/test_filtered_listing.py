@@ -0,0 +1,106 @@
+"""
+Listado con `filter` (CategoryIndex) y `search`: páginas con `limit` y
+`cursor`, y cursores de otro camino de lectura.
+"""
+import base64
+import json
+
+import pytest
+
+PRODUCTS = 30
+
+
+def category(i):
+    return "Tools" if i % 3 else "Garden"
+
+
+def name(i):
+    return f"{'Hammer' if i % 2 else 'Rake'} {i:02}"
+
+
+@pytest.fixture
+def catalog(handler):
+    body = [
+        {"ProductID": f"P{i:02}", "Name": name(i), "Category": category(i), "Quantity": i + 1, "LastPrice": PRODUCTS - i}
+        for i in range(PRODUCTS)
+    ]
+    assert handler.create_product({"body": json.dumps(body)}, None)["statusCode"] == 200
+    return handler
+
+
+def list_products(handler, **params):
+    response = handler.get_all_products({"queryStringParameters": params}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def read_all_pages(handler, limit, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page_params = {**params, "limit": str(limit)}
+        if cursor:
+            page_params["cursor"] = cursor
+        status, body = list_products(handler, **page_params)
+        assert status == 200
+        assert len(body["Items"]) <= limit
+        ids.extend(item["ProductID"] for item in body["Items"])
+        pages += 1
+        cursor = body["NextCursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def expected(predicate):
+    return [f"P{i:02}" for i in range(PRODUCTS) if predicate(i)]
+
+
+def encode(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+@pytest.mark.parametrize("filter_value", ["Tools", " tools "])
+def test_category_pages_cover_the_category_once(catalog, filter_value):
+    ids, pages = read_all_pages(catalog, 4, filter=filter_value)
+
+    assert ids == expected(lambda i: category(i) == "Tools")
+    assert pages == 5
+
+
+@pytest.mark.parametrize("search", ["ha", "hammer"])
+def test_category_and_search_pages(catalog, search):
+    # "ha": predicado sobre CategoryIndex; "hammer": índice de trigramas
+    ids, _ = read_all_pages(catalog, 3, filter="Garden", search=search)
+
+    assert sorted(ids) == expected(lambda i: category(i) == "Garden" and i % 2)
+
+
+def test_filtered_reads_resume_after_the_last_returned_item(catalog, monkeypatch):
+    # Lecturas más grandes que la página: el cursor es el último item devuelto
+    monkeypatch.setattr(catalog, "FILTERED_PAGE_SIZE", 7)
+
+    ids, _ = read_all_pages(catalog, 2, filter="Tools", search="ra")
+
+    assert ids == expected(lambda i: category(i) == "Tools" and not i % 2)
+
+
+def test_category_pages_in_memory_order(catalog):
+    ids, _ = read_all_pages(catalog, 4, filter="Tools", orderBy="LastPrice")
+
+    assert ids == expected(lambda i: category(i) == "Tools")[::-1]
+
+
+@pytest.mark.parametrize("params, cursor", [
+    # Cursor del CategoryIndex en un listado sin filtro
+    ({}, {"CategoryKey": "tools", "ProductID": "P01"}),
+    # Clave de la tabla en un listado por categoría
+    ({"filter": "Tools"}, {"ProductID": "P01"}),
+    # Desplazamiento de un orden en memoria sin `orderBy`
+    ({"filter": "Tools"}, {"Offset": 4}),
+    # Clave del CategoryIndex en un orden en memoria
+    ({"filter": "Tools", "orderBy": "LastPrice"}, {"CategoryKey": "tools", "ProductID": "P01"}),
+    ({"filter": "Tools"}, {"CategoryKey": 5, "ProductID": "P01"}),
+])
+def test_cursor_from_another_path_is_rejected(catalog, params, cursor):
+    status, body = list_products(catalog, limit="4", cursor=encode(cursor), **params)
+
+    assert status == 400
+    assert body["errors"] == ["Invalid cursor."]
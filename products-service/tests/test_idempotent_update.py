@@ -0,0 +1,64 @@
+"""
+PUT /products/{product_id} con Idempotency-Key: los ajustes repetidos se
+aplican una sola vez.
+"""
+import json
+
+
+def put_product(handler, body, key):
+    event = {
+        "pathParameters": {"product_id": "P1"},
+        "body": json.dumps(body),
+        "headers": {"Idempotency-Key": key},
+    }
+    response = handler.update_product(event, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def quantity(handler):
+    return handler.table.get_item(Key={"ProductID": "P1"})["Item"]["Quantity"]
+
+
+def test_replayed_update_is_applied_once(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 10})
+
+    assert put_product(handler, {"Quantity": -4}, "k1") == (200, {"message": "Product updated successfully!", "Quantity": 6})
+    status, body = put_product(handler, {"Quantity": -4}, "k1")
+
+    assert (status, body["Replayed"]) == (200, True)
+    assert quantity(handler) == 6
+    # Otra clave sí se aplica
+    assert put_product(handler, {"Quantity": -4}, "k2")[1]["Quantity"] == 2
+
+
+def test_floor_failure_does_not_burn_the_key(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 1})
+
+    assert put_product(handler, {"Quantity": -4}, "k1")[0] == 400
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 10})
+
+    assert put_product(handler, {"Quantity": -4}, "k1")[1]["Quantity"] == 6
+
+
+def test_key_is_only_accepted_for_quantity_updates(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Name": "Hammer", "Quantity": 10})
+
+    status, body = put_product(handler, {"Name": "Wrench", "Quantity": 3}, "k1")
+
+    assert status == 400
+    assert body["errors"] == ["Header 'Idempotency-Key' is only supported for Quantity-only updates."]
+    assert quantity(handler) == 10
+
+
+def test_replayed_adjustments_are_applied_once(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 10})
+    event = {
+        "body": json.dumps({"Adjustments": [{"ProductID": "P1", "delta": 5}, {"ProductID": "P1", "delta": -2}]}),
+        "headers": {"Idempotency-Key": "batch-1"},
+    }
+
+    assert handler.adjust_products(event, None)["statusCode"] == 200
+    response = handler.adjust_products(event, None)
+
+    assert (response["statusCode"], json.loads(response["body"])["Replayed"]) == (200, True)
+    assert quantity(handler) == 13
@@ -0,0 +1,89 @@
+"""
+Listado ordenado por los GSIs particionados (orderBy): cursores por
+partición y lecturas por página.
+"""
+import base64
+import json
+
+import pytest
+
+PRODUCTS = 80
+
+
+@pytest.fixture
+def catalog(handler):
+    body = [
+        {"ProductID": f"P{i:02}", "Name": f"Item {i:02}", "Category": "Tools",
+         "Quantity": (i * 37) % PRODUCTS + 1, "LastPrice": i + 1}
+        for i in range(PRODUCTS)
+    ]
+    assert handler.create_product({"body": json.dumps(body)}, None)["statusCode"] == 200
+    return handler
+
+
+def list_products(handler, **params):
+    response = handler.get_all_products({"queryStringParameters": params}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def read_all_pages(handler, order_by, limit):
+    values, cursor = [], None
+    while True:
+        params = {"orderBy": order_by, "limit": str(limit)}
+        if cursor:
+            params["cursor"] = cursor
+        status, body = list_products(handler, **params)
+        assert status == 200
+        assert len(body["Items"]) <= limit
+        values.extend(item[order_by.lstrip("-")] for item in body["Items"])
+        cursor = body["NextCursor"]
+        if cursor is None:
+            return values
+
+
+@pytest.mark.parametrize("order_by", ["Quantity", "-Quantity", "LastPrice", "-LastPrice"])
+def test_pages_follow_the_global_order(catalog, order_by):
+    values = read_all_pages(catalog, order_by, limit=7)
+
+    assert values == sorted(values, reverse=order_by.startswith("-"))
+    assert len(values) == PRODUCTS
+
+
+def test_shard_pages_read_about_one_page(catalog, monkeypatch):
+    query = catalog.table.query
+    read = []
+
+    def counting_query(**kwargs):
+        response = query(**kwargs)
+        read.append(len(response["Items"]))
+        return response
+
+    monkeypatch.setattr(catalog.table, "query", counting_query)
+    status, body = list_products(catalog, orderBy="Quantity", limit="10")
+
+    assert status == 200
+    assert [item["Quantity"] for item in body["Items"]] == list(range(1, 11))
+    # Con Limit=limit en cada partición serían 80 (SORT_SHARDS * limit)
+    assert sum(read) <= 40
+
+
+def test_cursor_from_another_index_is_rejected(catalog):
+    _, body = list_products(catalog, orderBy="Quantity", limit="5")
+
+    status, body = list_products(catalog, orderBy="Name", limit="5", cursor=body["NextCursor"])
+
+    assert status == 400
+    assert body["errors"] == ["Invalid cursor."]
+
+
+def test_cursor_with_a_key_of_another_shard_is_rejected(catalog):
+    _, body = list_products(catalog, orderBy="Quantity", limit="5")
+    cursor = json.loads(base64.urlsafe_b64decode(body["NextCursor"]))
+    shards = cursor["Shards"]
+    first = next(index for index, key in enumerate(shards) if key)
+    shards[(first + 1) % len(shards)] = shards[first]
+    tampered = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    status, body = list_products(catalog, orderBy="Quantity", limit="5", cursor=tampered)
+
+    assert status == 400
@@ -0,0 +1,96 @@
+"""
+Movimientos PRODUCT del stream de la tabla de productos y saldo OPENING del
+kardex.
+"""
+import json
+from datetime import datetime, timezone
+
+from boto3.dynamodb.types import TypeSerializer
+
+# 2024-05-10T12:00:00Z
+WRITTEN_AT = int(datetime(2024, 5, 10, 12, tzinfo=timezone.utc).timestamp())
+
+
+def stream_record(event_id, old=None, new=None):
+    serializer = TypeSerializer()
+    images = {"ApproximateCreationDateTime": WRITTEN_AT}
+    if old is not None:
+        images["OldImage"] = {k: serializer.serialize(v) for k, v in old.items()}
+    if new is not None:
+        images["NewImage"] = {k: serializer.serialize(v) for k, v in new.items()}
+    event_name = "MODIFY" if old is not None and new is not None else ("INSERT" if new is not None else "REMOVE")
+    return {"eventID": event_id, "eventName": event_name, "dynamodb": images}
+
+
+def kardex_totals(handler, product_id):
+    items = handler.index_table.query(
+        KeyConditionExpression="PK = :pk", ExpressionAttributeValues={":pk": f"KARDEX#{product_id}"}
+    )["Items"]
+    return {item["SK"]: item["Net"] for item in items}
+
+
+def movements(handler, product_id):
+    return handler.movements_table.query(
+        KeyConditionExpression="ProductID = :pid", ExpressionAttributeValues={":pid": product_id}
+    )["Items"]
+
+
+def test_product_changes_are_recorded_once(handler):
+    event = {"Records": [
+        stream_record("e1", new={"ProductID": "P1", "Quantity": 10}),
+        stream_record("e2", old={"ProductID": "P1", "Quantity": 10}, new={"ProductID": "P1", "Quantity": 6}),
+        stream_record("e3", old={"ProductID": "P1", "Quantity": 6, "Name": "A"}, new={"ProductID": "P1", "Quantity": 6, "Name": "B"}),
+        stream_record("e4", old={"ProductID": "P1", "Quantity": 6}),
+    ]}
+
+    handler.record_stock_movements(event, None)
+    # Reentrega del mismo lote: no cuenta nada dos veces
+    handler.record_stock_movements(event, None)
+
+    assert sorted(movement["Delta"] for movement in movements(handler, "P1")) == [-6, -4, 10]
+    assert {movement["NoteType"] for movement in movements(handler, "P1")} == {"PRODUCT"}
+    assert movements(handler, "P1")[0]["Date"] == "2024-05-10T12:00:00"
+    assert kardex_totals(handler, "P1") == {"2024-05#PRODUCT": 0}
+
+
+def test_note_writes_are_not_product_movements(handler):
+    event = {"Records": [stream_record(
+        "e1",
+        old={"ProductID": "P1", "Quantity": 10, "NoteWrite": "a"},
+        new={"ProductID": "P1", "Quantity": 15, "NoteWrite": "b"},
+    )]}
+
+    handler.record_stock_movements(event, None)
+
+    assert movements(handler, "P1") == []
+    assert kardex_totals(handler, "P1") == {}
+
+
+def test_note_source_header_marks_the_write(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 10})
+
+    def put(headers):
+        event = {"pathParameters": {"product_id": "P1"}, "body": json.dumps({"Quantity": 2}), "headers": headers}
+        return handler.update_product(event, None)
+
+    assert put({})["statusCode"] == 200
+    assert "NoteWrite" not in handler.table.get_item(Key={"ProductID": "P1"})["Item"]
+    assert put({"X-Stock-Source": "note"})["statusCode"] == 200
+    first = handler.table.get_item(Key={"ProductID": "P1"})["Item"]["NoteWrite"]
+    assert put({"X-Stock-Source": "note"})["statusCode"] == 200
+    assert handler.table.get_item(Key={"ProductID": "P1"})["Item"]["NoteWrite"] != first
+    assert put({"X-Stock-Source": "other"})["statusCode"] == 400
+
+
+def test_opening_backfill_covers_the_stock_before_the_history(handler):
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 12})
+    for sk, net in (("2024-05#INBOUND", 5), ("2024-05#PRODUCT", -3)):
+        handler.index_table.put_item(Item={"PK": "KARDEX#P1", "SK": sk, "Net": net})
+
+    assert handler.reindex_products({}, None)["kardex_openings"] == 1
+    assert kardex_totals(handler, "P1")["0000-00#OPENING"] == 10
+
+    # Ya escrito no se recalcula
+    handler.table.put_item(Item={"ProductID": "P1", "Quantity": 50})
+    assert handler.reindex_products({}, None)["kardex_openings"] == 0
+    assert kardex_totals(handler, "P1")["0000-00#OPENING"] == 10
@@ -0,0 +1,247 @@
+"""
+Comprobación del paquete de despliegue de un servicio con los modelos de
+botocore recortados (ver `package.patterns` en su serverless.yml).
+
+Arma en un directorio temporal el mismo contenido que empaqueta serverless
+con esos patrones y, en un proceso sin site-packages (`python -S`, como el
+boto3 vendorizado en /var/task de Lambda), carga los modelos, crea los
+recursos y clientes que usan los handlers y resuelve un endpoint por
+servicio. Si falta algún modelo termina con código 1. Cada servicio lo
+ejecuta antes de desplegar (`npm run deploy`, script `predeploy` de su
+package.json) con --check-only.
+
+Sin --check-only también compara tamaño, descompresión e init de boto3
+con el paquete sin recortar:
+
+    python scripts/check_botocore_bundle.py --service products-service --resources dynamodb
+    python scripts/check_botocore_bundle.py --service outbound-notes-service \
+        --resources dynamodb --clients s3 sqs --repeat 5
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+# Directorios que serverless nunca empaqueta (node_modules solo tiene el plugin)
+ALWAYS_EXCLUDED = (".git/", ".serverless/", "node_modules/")
+
+# Operación que se presigna por servicio para resolver su endpoint
+OPERATIONS = {
+    "dynamodb": ("get_item", {"TableName": "t", "Key": {"k": {"S": "v"}}}),
+    "s3": ("get_object", {"Bucket": "b", "Key": "k"}),
+    "sqs": ("send_message", {"QueueUrl": "https://sqs.us-east-1.amazonaws.com/1/q", "MessageBody": "m"}),
+}
+
+CHECK_CODE = r"""
+import json, os, sys, time
+
+started = time.perf_counter()
+import boto3
+
+resources, clients = ([name for name in arg.split(",") if name] for arg in sys.argv[1:3])
+assert boto3.__file__.startswith(os.getcwd()), "boto3 is not the vendored copy"
+session = boto3.session.Session(region_name="us-east-1")
+loader = session._session.get_component("data_loader")
+for name in ("endpoints", "partitions", "_retry", "sdk-default-configuration"):
+    loader.load_data(name)
+for name in resources + clients:
+    loader.load_service_model(name, "service-2")
+    loader.load_service_model(name, "endpoint-rule-set-1")
+
+# Presignar resuelve el endpoint con las reglas del servicio sin llamar a AWS
+operations = json.loads(sys.argv[3])
+for name in resources:
+    client = session.resource(name).meta.client
+    client.generate_presigned_url(operations[name][0], Params=operations[name][1])
+for name in clients:
+    client = session.client(name)
+    client.generate_presigned_url(operations[name][0], Params=operations[name][1])
+print(json.dumps({"init_ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def read_patterns(serverless_path):
+    """
+    Lista `package.patterns` de serverless.yml (sin depender de PyYAML).
+    """
+    patterns = []
+    section = None
+    with open(serverless_path) as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            indent = len(line) - len(line.lstrip())
+            if indent == 0:
+                section = "package" if stripped == "package:" else None
+            elif section == "package" and indent == 2:
+                section = "package" if stripped != "patterns:" else "patterns"
+            elif section == "patterns" and stripped.startswith("- "):
+                patterns.append(stripped[2:].strip().strip("'\""))
+    return patterns
+
+
+def glob_regex(pattern):
+    """
+    Glob de serverless (`**` cualquier ruta, `*` dentro de un directorio) a
+    expresión regular.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + r"\Z")
+
+
+def included(path, patterns):
+    """
+    Se incluye todo salvo lo excluido; gana el último patrón que coincide.
+    """
+    result = True
+    for negated, regex in patterns:
+        if regex.match(path):
+            result = not negated
+    return result
+
+
+def build_bundle(service_dir, destination, patterns):
+    """
+    Copia a `destination` los archivos de `service_dir` que empaqueta
+    serverless. Devuelve (archivos, bytes).
+    """
+    compiled = [(pattern.startswith("!"), glob_regex(pattern.lstrip("!"))) for pattern in patterns]
+    files, size = 0, 0
+    for root, dirs, names in os.walk(service_dir):
+        relative_root = os.path.relpath(root, service_dir).replace(os.sep, "/")
+        relative_root = "" if relative_root == "." else relative_root + "/"
+        dirs[:] = [name for name in dirs if not (relative_root + name + "/").startswith(ALWAYS_EXCLUDED)]
+        for name in names:
+            path = relative_root + name
+            if not included(path, compiled):
+                continue
+            target = os.path.join(destination, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(root, name), target)
+            files += 1
+            size += os.path.getsize(target)
+    return files, size
+
+
+def zip_bundle(bundle_dir, archive_path):
+    """
+    Comprime el paquete como lo sube serverless. Devuelve los segundos que
+    tarda en descomprimirse (lo que hace Lambda al iniciar un contenedor).
+    """
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for root, _, names in os.walk(bundle_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, bundle_dir))
+    with tempfile.TemporaryDirectory() as target:
+        started = time.perf_counter()
+        with zipfile.ZipFile(archive_path) as archive:
+            archive.extractall(target)
+        return time.perf_counter() - started
+
+
+def check_bundle(bundle_dir, resources, clients):
+    """
+    Carga modelos y crea recursos y clientes en un proceso que solo ve el
+    paquete. Devuelve (ok, init_ms o mensaje de error).
+    """
+    env = dict(os.environ, AWS_ACCESS_KEY_ID="check", AWS_SECRET_ACCESS_KEY="check")
+    env.pop("PYTHONPATH", None)
+    result = subprocess.run(
+        [sys.executable, "-S", "-c", CHECK_CODE, ",".join(resources), ",".join(clients), json.dumps(OPERATIONS)],
+        env=env, cwd=bundle_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return False, result.stderr.strip().splitlines()[-1]
+    return True, json.loads(result.stdout)["init_ms"]
+
+
+def measure(name, args, patterns, workdir, repeat):
+    bundle_dir = os.path.join(workdir, name)
+    files, size = build_bundle(args.service, bundle_dir, patterns)
+    archive_path = os.path.join(workdir, f"{name}.zip")
+    unzip = min(zip_bundle(bundle_dir, archive_path) for _ in range(repeat))
+    # La primera ejecución deja los .pyc en el paquete (como en un despliegue
+    # ya compilado) y no cuenta; se toma la mejor de las N siguientes
+    checks = [check_bundle(bundle_dir, args.resources, args.clients) for _ in range(repeat + 1)]
+    failed = next((detail for ok, detail in checks if not ok), None)
+    return {
+        "name": name,
+        "files": files,
+        "size": size,
+        "zip": os.path.getsize(archive_path),
+        "unzip": unzip,
+        "init_ms": None if failed else min(detail for _, detail in checks[1:]),
+        "error": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", required=True, help="directorio del servicio (con serverless.yml)")
+    parser.add_argument("--resources", nargs="*", default=[], help="boto3.resource que crean los handlers")
+    parser.add_argument("--clients", nargs="*", default=[], help="boto3.client que crean los handlers")
+    parser.add_argument("--repeat", type=int, default=3, help="se informa la mejor de N ejecuciones")
+    parser.add_argument("--check-only", action="store_true",
+                        help="solo el paquete recortado, una vez, sin comparar con el completo")
+    args = parser.parse_args()
+    args.service = os.path.abspath(args.service)
+    unknown = sorted(set(args.resources + args.clients) - set(OPERATIONS))
+    if unknown:
+        parser.error(f"no check operation for: {', '.join(unknown)}")
+
+    patterns = read_patterns(os.path.join(args.service, "serverless.yml"))
+    # Referencia: los mismos patrones sin el recorte de boto3/data y botocore/data
+    untrimmed = [pattern for pattern in patterns if not re.match(r"!?boto(?:3|core)/data/", pattern)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.check_only:
+            results = [measure("trimmed", args, patterns, workdir, 1)]
+        else:
+            results = [
+                measure("untrimmed", args, untrimmed, workdir, args.repeat),
+                measure("trimmed", args, patterns, workdir, args.repeat),
+            ]
+
+    print(f"{os.path.basename(args.service)}: resources {', '.join(args.resources) or '-'}; "
+          f"clients {', '.join(args.clients) or '-'}")
+    print(f"{'bundle':>10} {'files':>7} {'size (MB)':>10} {'zip (MB)':>9} {'unzip (s)':>10} {'init (ms)':>10}")
+    for result in results:
+        init = "-" if result["init_ms"] is None else f"{result['init_ms']:.1f}"
+        print(
+            f"{result['name']:>10} {result['files']:>7} {result['size'] / 2**20:>10.1f} "
+            f"{result['zip'] / 2**20:>9.1f} {result['unzip']:>10.3f} {init:>10}"
+        )
+
+    failures = [result for result in results if result["error"]]
+    for result in failures:
+        print(f"FAIL ({result['name']}): {result['error']}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()